@@ -0,0 +1,295 @@
+"""
+قياس أداء الجمع بالكامل بدون حسابات تيليجرام (FakeTelegramClient)
+
+python -m benchmarks.bench_collector --dialogs 20 --messages 500
+python -m benchmarks.bench_collector --latency-ms 20 --flood-every 300 --sections pipeline
+
+الأقسام:
+- extract : link_utils.extract_links_from_message
+- classify: link_utils.filter_and_classify_link
+- files   : file_extractors.extract_links_from_file (PDF / DOCX)
+- process : collector.process_message (بالتسلسل، حتى طابور الإرسال)
+- pipeline: فحص التاريخ الكامل عبر الـ pipeline (مع زمن الشبكة و FloodWait)
+"""
+import argparse
+import asyncio
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional
+
+# قبل أي import من المشروع: قاعدة بيانات مؤقتة وإعدادات وهمية
+_tmp_dir = tempfile.mkdtemp(prefix="bench_collector_")
+os.environ.setdefault("BOT_TOKEN", "bench")
+os.environ.setdefault("API_ID", "1")
+os.environ.setdefault("API_HASH", "bench")
+os.environ["DATABASE_PATH"] = os.path.join(_tmp_dir, "bench.db")
+os.environ.setdefault("SEND_MIN_INTERVAL_SECONDS", "0")
+
+import collector  # noqa: E402
+import metrics  # noqa: E402
+from benchmarks.fake_telethon import (  # noqa: E402
+    FakeNetwork,
+    FakeScale,
+    FakeTelegramClient,
+    make_dialogs,
+)
+from database import init_db, save_admin_target  # noqa: E402
+from file_extractors import extract_links_from_file, shutdown_parse_pool  # noqa: E402
+from link_utils import extract_links_from_message, filter_and_classify_link  # noqa: E402
+from sender import drain_senders  # noqa: E402
+
+SECTIONS = ("extract", "classify", "files", "process", "pipeline")
+
+TARGETS = {"telegram": "@bench_tg_target", "whatsapp": "@bench_wa_target"}
+
+
+# ======================
+# Results
+# ======================
+
+class Result:
+    def __init__(self, name: str, messages: int, links: int, seconds: float, latencies: List[float]):
+        self.name = name
+        self.messages = messages
+        self.links = links
+        self.seconds = max(seconds, 1e-9)
+        self.latencies = sorted(latencies)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        return self.latencies[int(q * (len(self.latencies) - 1))]
+
+    def row(self) -> str:
+        p50, p99 = self.percentile(0.5), self.percentile(0.99)
+        return (
+            f"{self.name:<9} {self.messages:>9} {self.links:>9} {self.seconds:>9.2f} "
+            f"{self.messages / self.seconds:>11.0f} {self.links / self.seconds:>11.0f} "
+            f"{_ms(p50)} {_ms(p99)}"
+        )
+
+
+def _ms(seconds: Optional[float]) -> str:
+    return f"{seconds * 1000:9.3f}" if seconds is not None else f"{'-':>9}"
+
+
+HEADER = (
+    f"{'section':<9} {'messages':>9} {'links':>9} {'seconds':>9} "
+    f"{'msg/s':>11} {'links/s':>11} {'p50 ms':>9} {'p99 ms':>9}"
+)
+
+
+def _timed_each(items, fn: Callable) -> tuple:
+    latencies = []
+    out = 0
+    started = time.perf_counter()
+    for item in items:
+        t = time.perf_counter()
+        out += fn(item)
+        latencies.append(time.perf_counter() - t)
+    return out, time.perf_counter() - started, latencies
+
+
+# ======================
+# Sections
+# ======================
+
+def bench_extract(messages) -> Result:
+    links, seconds, lat = _timed_each(messages, lambda m: len(extract_links_from_message(m)))
+    return Result("extract", len(messages), links, seconds, lat)
+
+
+def bench_classify(messages) -> Result:
+    links = [link for m in messages for link in extract_links_from_message(m)]
+    accepted, seconds, lat = _timed_each(links, lambda u: 1 if filter_and_classify_link(u) else 0)
+    return Result("classify", len(messages), accepted, seconds, lat)
+
+
+async def bench_files(messages, network: FakeNetwork) -> Result:
+    client = FakeTelegramClient([], network)
+    file_messages = [m for m in messages if m.file]
+
+    latencies = []
+    links = 0
+    started = time.perf_counter()
+    for m in file_messages:
+        t = time.perf_counter()
+        links += len(await extract_links_from_file(client, m))
+        latencies.append(time.perf_counter() - t)
+
+    return Result("files", len(file_messages), links, time.perf_counter() - started, latencies)
+
+
+async def bench_process(messages, network: FakeNetwork, admin_id: int) -> Result:
+    client = FakeTelegramClient([], network, me_id=admin_id)
+    _set_targets(admin_id)
+
+    latencies = []
+    started = time.perf_counter()
+    for m in messages:
+        t = time.perf_counter()
+        await collector.process_message(m, client, admin_id)
+        latencies.append(time.perf_counter() - t)
+    seconds = time.perf_counter() - started
+
+    await drain_senders(admin_id)
+    return Result("process", len(messages), _sent_links(network), seconds, latencies)
+
+
+async def bench_pipeline(dialogs, network: FakeNetwork, admin_id: int) -> Result:
+    client = FakeTelegramClient(dialogs, network, me_id=admin_id)
+    _set_targets(admin_id)
+
+    pipeline = collector._ClientPipeline(client, admin_id, "bench")
+    checkpoints = collector._ScanCheckpoints(admin_id)
+    started = time.perf_counter()
+    try:
+        await collector._scan_history(client, checkpoints, pipeline)
+        await pipeline.close()
+    finally:
+        await drain_senders(admin_id)
+        checkpoints.flush()
+    seconds = time.perf_counter() - started
+
+    scanned = int(metrics.counter_total(metrics.snapshot(), "messages_scanned_total", session="bench"))
+    return Result("pipeline", scanned, _sent_links(network), seconds, [])
+
+
+# ======================
+# Helpers
+# ======================
+
+def _set_targets(admin_id: int):
+    for platform, target in TARGETS.items():
+        save_admin_target(admin_id, platform, target)
+
+
+def _sent_links(network: FakeNetwork) -> int:
+    return sum(len(text.splitlines()) for _, text in network.sent)
+
+
+def _start_collector_run(history_days: int):
+    # نفس الحالة التي يضبطها start_collection بدون تشغيل العملاء
+    collector._collecting = True
+    collector._selected_platform = None
+    collector._collect_mode = collector.COLLECT_MODE_HISTORY
+    collector._history_cutoff_utc = datetime.now(timezone.utc) - timedelta(days=history_days)
+    collector._stop_event.clear()
+
+
+def _peak_rss_mb(who: int) -> float:
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux: KB، macOS: bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# ======================
+# Runner
+# ======================
+
+async def _run(args) -> List[Result]:
+    scale = FakeScale(
+        dialogs=args.dialogs,
+        messages_per_dialog=args.messages,
+        link_ratio=args.link_ratio,
+        entity_ratio=args.entity_ratio,
+        button_ratio=args.button_ratio,
+        file_ratio=args.file_ratio,
+        seed=args.seed,
+    )
+    dialogs = make_dialogs(scale)
+    messages = [m for d in dialogs for m in d.messages]
+    sections = args.sections.split(",")
+
+    print(
+        f"dialogs={scale.dialogs} messages={len(messages)} "
+        f"files={sum(1 for m in messages if m.file)} latency={args.latency_ms}ms "
+        f"flood_every={args.flood_every}"
+    )
+
+    _start_collector_run(scale.history_days + 1)
+    results = []
+
+    # القسمين الأولين بدون شبكة أصلًا
+    if "extract" in sections:
+        results.append(bench_extract(messages))
+    if "classify" in sections:
+        results.append(bench_classify(messages))
+
+    if "files" in sections:
+        results.append(await bench_files(messages, FakeNetwork(latency_ms=args.latency_ms)))
+
+    # مشرف مختلف لكل قسم: منع التكرار لا يخلط بين الأقسام
+    if "process" in sections:
+        net = FakeNetwork(latency_ms=args.latency_ms)
+        results.append(await bench_process(messages, net, admin_id=1001))
+
+    if "pipeline" in sections:
+        net = FakeNetwork(
+            latency_ms=args.latency_ms,
+            flood_every=args.flood_every,
+            flood_seconds=args.flood_seconds,
+        )
+        results.append(await bench_pipeline(dialogs, net, admin_id=1002))
+        print(f"pipeline network: requests={net.requests} floods={net.floods} sends={len(net.sent)}")
+
+    collector._collecting = False
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dialogs", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=500, help="messages per dialog")
+    parser.add_argument("--link-ratio", type=float, default=0.3)
+    parser.add_argument("--entity-ratio", type=float, default=0.1)
+    parser.add_argument("--button-ratio", type=float, default=0.05)
+    parser.add_argument("--file-ratio", type=float, default=0.01)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--flood-every", type=int, default=0, help="FloodWait every N requests (0 = never)")
+    parser.add_argument("--flood-seconds", type=int, default=1)
+    parser.add_argument("--sections", default=",".join(SECTIONS))
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    init_db()
+
+    try:
+        results = asyncio.run(_run(args))
+    finally:
+        shutdown_parse_pool()
+
+    print(HEADER)
+    for r in results:
+        print(r.row())
+
+    # نفس مقاييس /stats (تشمل مرحلة الـ pipeline)
+    snap = metrics.snapshot()
+    for name in (
+        "process_message_seconds",
+        "message_pipeline_seconds",
+        "extract_links_from_file_seconds",
+        "send_unique_link_seconds",
+    ):
+        summary = metrics.histogram_summary(snap, name)
+        if summary:
+            print(
+                f"{name}: n={summary['count']} avg={summary['avg'] * 1000:.3f}ms "
+                f"p50<={summary['p50'] * 1000:g}ms p99<={summary['p99'] * 1000:g}ms"
+            )
+
+    # الأبناء = Processes تحليل الملفات
+    print(
+        f"peak RSS: self={_peak_rss_mb(resource.RUSAGE_SELF):.1f} MB "
+        f"parse workers={_peak_rss_mb(resource.RUSAGE_CHILDREN):.1f} MB"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+مقارنة محلل DOCX الجديد (zip + iterparse) بالنسخة القديمة (python-docx)
+
+python -m benchmarks.bench_docx --paragraphs 5000 --table-rows 200 --merged-cols 6
+
+كل محلل يعمل في Process جديد لقياس الذاكرة (peak RSS) بشكل منفصل
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from typing import List, Set
+
+# file_extractors → database → config
+os.environ.setdefault("BOT_TOKEN", "bench")
+os.environ.setdefault("API_ID", "1")
+os.environ.setdefault("API_HASH", "bench")
+os.environ.setdefault("DATABASE_PATH", os.path.join(tempfile.mkdtemp(prefix="bench_docx_"), "bench.db"))
+
+from benchmarks.corpus import make_docx_bytes, make_link, make_text  # noqa: E402
+from file_extractors import FileSource, _extract_from_docx, _open_source  # noqa: E402
+from link_utils import extract_urls_from_text  # noqa: E402
+
+
+# ======================
+# Legacy (قبل التعديل)
+# ======================
+
+def legacy_extract_from_docx(source: FileSource) -> List[str]:
+    links: Set[str] = set()
+
+    try:
+        from docx import Document
+
+        doc = Document(_open_source(source))
+
+        for para in doc.paragraphs:
+            links.update(extract_urls_from_text(para.text))
+
+        for table in doc.tables:
+            for row in table.rows:
+                for cell in row.cells:
+                    links.update(extract_urls_from_text(cell.text))
+
+        # Hyperlinks relationships
+        try:
+            rels = doc.part.rels
+            for rel in rels.values():
+                if rel.reltype and "hyperlink" in rel.reltype:
+                    target = getattr(rel, "target_ref", None)
+                    if target:
+                        links.add(str(target))
+        except Exception:
+            pass
+
+    except Exception:
+        pass
+
+    return list(links)
+
+
+PARSERS = {
+    "python-docx": legacy_extract_from_docx,
+    "streaming": _extract_from_docx,
+}
+
+
+# ======================
+# Runner
+# ======================
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _measure(name: str, path: str, rounds: int, out):
+    parser = PARSERS[name]
+    baseline = _peak_rss_mb()
+
+    best = float("inf")
+    links: List[str] = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        links = parser(path)
+        best = min(best, time.perf_counter() - started)
+
+    out.put((name, best, _peak_rss_mb() - baseline, sorted(links)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--paragraphs", type=int, default=5000)
+    parser.add_argument("--table-rows", type=int, default=200)
+    parser.add_argument("--merged-cols", type=int, default=6)
+    parser.add_argument("--break-paragraphs", type=int, default=30)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    lines = [make_text(rnd, 0.05) for _ in range(args.paragraphs)]
+    data = make_docx_bytes(
+        lines,
+        make_link(rnd),
+        table_rows=args.table_rows,
+        merged_cols=args.merged_cols,
+        header=f"header {make_link(rnd)}",
+        break_links=[make_link(rnd) for _ in range(args.break_paragraphs)],
+    )
+
+    fd, path = tempfile.mkstemp(suffix=".docx")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+
+    print(
+        f"docx: {len(data) / 1024:.0f} KB  paragraphs={args.paragraphs} "
+        f"table rows={args.table_rows} merged cols={args.merged_cols} "
+        f"break paragraphs={args.break_paragraphs}"
+    )
+
+    ctx = multiprocessing.get_context("spawn")
+    out = ctx.Queue()
+    results = {}
+
+    try:
+        for name in PARSERS:
+            proc = ctx.Process(target=_measure, args=(name, path, args.rounds, out))
+            proc.start()
+            result = out.get()
+            proc.join()
+            results[result[0]] = result[1:]
+    finally:
+        os.remove(path)
+
+    for name, (seconds, rss, links) in results.items():
+        print(f"{name:<12}: {seconds * 1000:8.1f} ms  peak RSS +{rss:6.1f} MB  links={len(links)}")
+
+    old_t, _, old_links = results["python-docx"]
+    new_t, _, new_links = results["streaming"]
+    print(f"speedup     : {old_t / new_t:.2f}x")
+    print(f"links       : missing={len(set(old_links) - set(new_links))} extra={len(set(new_links) - set(old_links))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+مقارنة الماسح الجديد (تمريرة واحدة + prefilter) بالتمريرات الثلاث القديمة
+ومقارنة المصنف الجديد (host بالضبط + المفتاح) بسلسلة الـ regex القديمة
+(المصنف للدقة وليس للسرعة: على نفس المدخلات الموحدة هو أبطأ من السلسلة، انظر "same canon")
+
+python -m benchmarks.bench_link_scan --messages 20000
+"""
+import argparse
+import re
+import time
+from typing import Callable, List, Set
+
+from benchmarks.corpus import make_corpus
+from link_utils import (
+    extract_urls_from_text,
+    filter_and_classify_link,
+    canonicalize_link,
+    classified_links,
+    _normalize_url,
+)
+
+
+# ======================
+# Legacy (قبل التعديل)
+# ======================
+
+# نفس التطبيع الحالي للطرفين: المقارنة على المسح فقط
+
+URL_REGEX = re.compile(r"(https?://[^\s<>\"]+)", re.IGNORECASE)
+BARE_URL_REGEX = re.compile(r"((?:www\.)[^\s<>\"]+)", re.IGNORECASE)
+DOMAIN_URL_REGEX = re.compile(
+    r"((?:[a-z0-9-]+\.)+[a-z]{2,}(?:/[^\s<>\"]*)?)",
+    re.IGNORECASE
+)
+
+
+def legacy_extract_urls_from_text(text: str) -> Set[str]:
+    found: Set[str] = set()
+    if not text:
+        return found
+
+    for u in URL_REGEX.findall(text):
+        found.add(_normalize_url(u))
+
+    for u in BARE_URL_REGEX.findall(text):
+        found.add(_normalize_url(u))
+
+    for u in DOMAIN_URL_REGEX.findall(text):
+        if len(u) >= 6:
+            found.add(_normalize_url(u))
+
+    return found
+
+
+TG_GROUP_REGEX = re.compile(r"https?://t\.me/(joinchat/|\+)[A-Za-z0-9_-]+", re.I)
+TG_CHANNEL_REGEX = re.compile(r"https?://t\.me/[A-Za-z0-9_]+$", re.I)
+TG_MESSAGE_REGEX = re.compile(r"https?://t\.me/(?:c/\d+|[A-Za-z0-9_]+)/\d+", re.I)
+TG_ADDLIST_REGEX = re.compile(r"https?://t\.me/addlist/[A-Za-z0-9_-]+", re.I)
+WA_GROUP_REGEX = re.compile(r"https?://chat\.whatsapp\.com/[A-Za-z0-9]+", re.I)
+
+
+def legacy_filter_and_classify_link(url: str):
+    return _legacy_cascade(canonicalize_link(url))
+
+
+def legacy_collector_classify(links: List[str]) -> list:
+    # المسار القديم في collector: canonicalize_link ثم filter_and_classify_link (تطبيع مرتين)
+    return [legacy_filter_and_classify_link(canonicalize_link(u)) for u in links]
+
+
+def legacy_collector_classify_once(links: List[str]) -> list:
+    # نفس السلسلة القديمة بتطبيع واحد: الفرق المتبقي هو المصنف فقط
+    return [_legacy_cascade(u) for u in links]
+
+
+def _legacy_cascade(url: str):
+    if "t.me" in url:
+        if TG_ADDLIST_REGEX.match(url):
+            return ("telegram", "addlist")
+        if TG_MESSAGE_REGEX.match(url):
+            return ("telegram", "message")
+        if TG_GROUP_REGEX.match(url):
+            return ("telegram", "group")
+        if TG_CHANNEL_REGEX.match(url):
+            return ("telegram", "channel")
+        return None
+
+    if "whatsapp.com" in url or "wa.me" in url:
+        if WA_GROUP_REGEX.match(url):
+            return ("whatsapp", "group")
+        return None
+
+    return None
+
+
+# ======================
+# Runner
+# ======================
+
+def _bench(fn: Callable[[str], Set[str]], corpus: List[str], rounds: int):
+    best = float("inf")
+    total = 0
+    for _ in range(rounds):
+        started = time.perf_counter()
+        total = 0
+        for text in corpus:
+            total += len(fn(text))
+        best = min(best, time.perf_counter() - started)
+    return best, total
+
+
+def _bench_classify(fn: Callable[[str], object], links: List[str], rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for u in links:
+            fn(u)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _classified(fn: Callable[[str], Set[str]], corpus: List[str]) -> Set[tuple]:
+    out = set()
+    for i, text in enumerate(corpus):
+        for u in fn(text):
+            c = filter_and_classify_link(u)
+            if c:
+                out.add((i, c))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--link-ratio", type=float, default=0.3)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.messages, link_ratio=args.link_ratio)
+
+    old_t, old_n = _bench(legacy_extract_urls_from_text, corpus, args.rounds)
+    new_t, new_n = _bench(extract_urls_from_text, corpus, args.rounds)
+
+    print(f"messages: {len(corpus)}  (link ratio {args.link_ratio})")
+    print(f"legacy 3-pass : {old_t * 1000:8.1f} ms  {len(corpus) / old_t:10.0f} msg/s  candidates={old_n}")
+    print(f"single-pass   : {new_t * 1000:8.1f} ms  {len(corpus) / new_t:10.0f} msg/s  candidates={new_n}")
+    print(f"speedup       : {old_t / new_t:.2f}x")
+
+    # الروابط المقبولة بعد التصنيف يجب ألا تنقص
+    old_c = _classified(legacy_extract_urls_from_text, corpus)
+    new_c = _classified(extract_urls_from_text, corpus)
+    print(f"classified    : legacy={len(old_c)} single-pass={len(new_c)} lost={len(old_c - new_c)}")
+
+    # المصنف: نفس المرشحين (بما فيها الدومينات العادية) للطرفين
+    per_message = [list(extract_urls_from_text(text)) for text in corpus]
+    per_message = [links for links in per_message if links]
+    candidates = [u for links in per_message for u in links]
+
+    diff = sum(
+        1 for u in candidates
+        if legacy_filter_and_classify_link(u) != filter_and_classify_link(u)
+    )
+    print(f"candidates    : {len(candidates)}  mismatches={diff}")
+
+    # رابط واحد (يشمل التطبيع في الطرفين)
+    old_t = _bench_classify(legacy_filter_and_classify_link, candidates, args.rounds)
+    new_t = _bench_classify(filter_and_classify_link, candidates, args.rounds)
+    print(f"single link   : cascade {old_t * 1000:7.1f} ms | dispatch {new_t * 1000:7.1f} ms | {old_t / new_t:.2f}x")
+
+    # مسار collector: كل روابط الرسالة دفعة واحدة (الروابط موحدة من الاستخراج)
+    # + بناء الرابط من المفتاح (ما يُرسل ويُخزن فعلاً)
+    new_t = _bench_classify(lambda links: classified_links(links, canonical=True), per_message, args.rounds)
+
+    old_t = _bench_classify(legacy_collector_classify, per_message, args.rounds)
+    print(f"per message   : legacy {old_t * 1000:7.1f} ms | batch    {new_t * 1000:7.1f} ms | {old_t / new_t:.2f}x")
+
+    # أغلب الفرق أعلاه من حذف التطبيع الثاني وليس من المصنف
+    old_t = _bench_classify(legacy_collector_classify_once, per_message, args.rounds)
+    print(f"  same canon  : legacy {old_t * 1000:7.1f} ms | batch    {new_t * 1000:7.1f} ms | {old_t / new_t:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
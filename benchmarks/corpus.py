@@ -0,0 +1,226 @@
+import io
+import random
+import zipfile
+from typing import List
+
+# ======================
+# Synthetic Message Corpus
+# ======================
+
+# قريب من الرسائل الحقيقية: أغلبها نص عادي، وبعضها فيه روابط متنوعة
+
+_WORDS = (
+    "مرحبا", "اشتراك", "قناة", "قروب", "رابط", "عرض", "خصم", "اليوم",
+    "hello", "join", "group", "free", "course", "download", "links", "new",
+)
+
+_TG_LINKS = (
+    "https://t.me/+{code}",
+    "http://T.me/joinchat/{code}",
+    "t.me/+{code}?ref=x",
+    "https://telegram.me/+{code}",
+    "https://t.me/{name}",
+    "https://t.me/{name}/{num}",
+    "https://t.me/c/{num}/{num}",
+    "https://t.me/addlist/{code}",
+)
+
+_WA_LINKS = (
+    "https://chat.whatsapp.com/{code}",
+    "chat.whatsapp.com/{code}",
+    "https://wa.me/{num}",
+)
+
+_OTHER_LINKS = (
+    "https://www.instagram.com/{name}",
+    "www.example.com/{name}",
+    "https://youtu.be/{code}",
+    "example.org",
+    "hint.me/{name}",
+)
+
+
+def _fill(template: str, rnd: random.Random) -> str:
+    return template.format(
+        code="".join(rnd.choice("ABCdef123_-") for _ in range(16)),
+        name="".join(rnd.choice("abcdefgh_") for _ in range(8)),
+        num=rnd.randint(1, 99999),
+    )
+
+
+def make_text(rnd: random.Random, link_ratio: float = 0.3) -> str:
+    """
+    رسالة واحدة: نص + (أحيانًا) روابط تيليجرام / واتساب / أخرى
+    """
+    words = [rnd.choice(_WORDS) for _ in range(rnd.randint(5, 60))]
+
+    if rnd.random() < link_ratio:
+        pool = _TG_LINKS + _WA_LINKS
+        for _ in range(rnd.randint(1, 4)):
+            words.insert(rnd.randrange(len(words) + 1), _fill(rnd.choice(pool), rnd))
+
+    if rnd.random() < 0.2:
+        words.insert(rnd.randrange(len(words) + 1), _fill(rnd.choice(_OTHER_LINKS), rnd))
+
+    return " ".join(words)
+
+
+def make_corpus(size: int, seed: int = 1, link_ratio: float = 0.3) -> List[str]:
+    rnd = random.Random(seed)
+    return [make_text(rnd, link_ratio) for _ in range(size)]
+
+
+def make_link(rnd: random.Random) -> str:
+    return _fill(rnd.choice(_TG_LINKS + _WA_LINKS), rnd)
+
+
+# ======================
+# Synthetic Files (PDF / DOCX)
+# ======================
+
+# ملفات صغيرة صالحة بدون أي مكتبة: نص + رابط مخفي (annotation / hyperlink)
+
+def make_pdf_bytes(lines: List[str], uri: str, pages: int = 1) -> bytes:
+    def esc(s: str) -> str:
+        return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objects: List[bytes] = []
+    page_ids = [3 + i * 3 for i in range(pages)]
+    font_id = 3 + pages * 3
+
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+
+    for pid in page_ids:
+        body = "BT /F1 11 Tf 50 750 Td 14 TL " + " ".join(
+            f"({esc(line)}) '" for line in lines
+        ) + " ET"
+        stream = body.encode("latin-1", "replace")
+
+        objects.append((
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Contents {pid + 1} 0 R /Resources << /Font << /F1 {font_id} 0 R >> >> "
+            f"/Annots [{pid + 2} 0 R] >>"
+        ).encode())
+        objects.append(
+            f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream"
+        )
+        objects.append((
+            f"<< /Type /Annot /Subtype /Link /Rect [50 50 300 70] /Border [0 0 0] "
+            f"/A << /S /URI /URI ({esc(uri)}) >> >>"
+        ).encode())
+
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n".encode() + obj + b"\nendobj\n"
+
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for off in offsets:
+        out += f"{off:010d} 00000 n \n".encode()
+    out += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref}\n%%EOF\n"
+    ).encode()
+
+    return bytes(out)
+
+
+_DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '<Override PartName="/word/header1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.header+xml"/>'
+    '</Types>'
+)
+
+_DOCX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+_W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+_R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+
+def make_docx_bytes(
+    lines: List[str],
+    uri: str,
+    table_rows: int = 2,
+    merged_cols: int = 1,
+    header: str = "",
+    break_links: List[str] = ()
+) -> bytes:
+    """
+    merged_cols > 1: كل صف خلية واحدة مدمجة على عدة أعمدة (gridSpan)
+    header: نص في header1.xml (مربوط من sectPr)
+    break_links: فقرة لكل رابط يليه br / cr / tab ثم نص في نفس الـ run
+    """
+    from xml.sax.saxutils import escape, quoteattr
+
+    def para(text: str) -> str:
+        return f'<w:p><w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p>'
+
+    body = "".join(para(line) for line in lines)
+    for i, link in enumerate(break_links):
+        sep = ("<w:br/>", "<w:cr/>", "<w:tab/>")[i % 3]
+        body += f'<w:p><w:r><w:t>{escape(link)}</w:t>{sep}<w:t>Next line here</w:t></w:r></w:p>'
+    body += (
+        '<w:p><w:hyperlink r:id="rIdLink1"><w:r><w:t>اضغط هنا</w:t></w:r></w:hyperlink></w:p>'
+    )
+    if table_rows:
+        span = f'<w:tcPr><w:gridSpan w:val="{merged_cols}"/></w:tcPr>' if merged_cols > 1 else ""
+        grid = "<w:tblGrid>" + '<w:gridCol w:w="1000"/>' * merged_cols + "</w:tblGrid>"
+        rows = "".join(
+            f"<w:tr><w:tc>{span}{para(lines[i % len(lines)] if lines else '')}</w:tc></w:tr>"
+            for i in range(table_rows)
+        )
+        body += f"<w:tbl>{grid}{rows}</w:tbl>"
+
+    if header:
+        body += '<w:sectPr><w:headerReference w:type="default" r:id="rIdHeader1"/></w:sectPr>'
+
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        f'<w:document xmlns:w="{_W_NS}" xmlns:r="{_R_NS}"><w:body>{body}</w:body></w:document>'
+    )
+    rels = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rIdLink1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/hyperlink" '
+        f'Target={quoteattr(uri)} TargetMode="External"/>'
+        + (
+            '<Relationship Id="rIdHeader1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/header" '
+            'Target="header1.xml"/>'
+            if header else ""
+        )
+        + '</Relationships>'
+    )
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", _DOCX_CONTENT_TYPES)
+        z.writestr("_rels/.rels", _DOCX_ROOT_RELS)
+        z.writestr("word/document.xml", document)
+        z.writestr("word/_rels/document.xml.rels", rels)
+        if header:
+            z.writestr(
+                "word/header1.xml",
+                f'<w:hdr xmlns:w="{_W_NS}" xmlns:r="{_R_NS}">{para(header)}</w:hdr>'
+            )
+    return buf.getvalue()
@@ -0,0 +1,308 @@
+"""
+بديل محلي لـ TelegramClient للقياس بدون حسابات حقيقية
+
+- محادثات ورسائل مولدة (نص + entities + أزرار + ملفات PDF / DOCX)
+- زمن استجابة مصطنع لكل طلب شبكة
+- FloodWait كل N طلب (مثل تيليجرام عند الضغط)
+"""
+import asyncio
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from telethon.errors import FloodWaitError
+from telethon.tl.types import MessageEntityTextUrl, MessageEntityUrl
+
+from benchmarks.corpus import make_text, make_link, make_pdf_bytes, make_docx_bytes
+from file_extractors import PDF_MIME, DOCX_MIME
+
+# ======================
+# Settings
+# ======================
+
+# مثل Telethon: طلب شبكة واحد لكل 100 رسالة / محادثة
+PAGE_SIZE = 100
+
+
+@dataclass
+class FakeScale:
+    dialogs: int = 20
+    messages_per_dialog: int = 500
+    link_ratio: float = 0.3
+    entity_ratio: float = 0.1
+    button_ratio: float = 0.05
+    file_ratio: float = 0.01
+    # ملفات بمحتوى مكرر (إعادة رفع) → تختبر كاش الملفات
+    file_repeat_ratio: float = 0.3
+    history_days: int = 30
+    seed: int = 1
+
+
+@dataclass
+class FakeNetwork:
+    latency_ms: float = 0.0
+    # 0 = بدون FloodWait
+    flood_every: int = 0
+    flood_seconds: int = 1
+    requests: int = 0
+    floods: int = 0
+    sent: List[tuple] = field(default_factory=list)
+
+
+# ======================
+# Fake Telethon Objects
+# ======================
+
+class FakeButton:
+    def __init__(self, text: str, url: Optional[str] = None):
+        self.text = text
+        self.url = url
+
+
+class FakeRow:
+    def __init__(self, buttons: List[FakeButton]):
+        self.buttons = buttons
+
+
+class FakeReplyMarkup:
+    def __init__(self, rows: List[FakeRow]):
+        self.rows = rows
+
+
+class FakeDocument:
+    def __init__(self, doc_id: int):
+        self.id = doc_id
+
+
+class FakeFile:
+    def __init__(self, name: str, mime_type: str, data: bytes):
+        self.name = name
+        self.mime_type = mime_type
+        self.size = len(data)
+        self.data = data
+
+
+class FakeMessage:
+    def __init__(
+        self,
+        msg_id: int,
+        chat_id: int,
+        date: datetime,
+        text: str,
+        entities=None,
+        reply_markup=None,
+        file: Optional[FakeFile] = None,
+        document: Optional[FakeDocument] = None,
+    ):
+        self.id = msg_id
+        self.chat_id = chat_id
+        self.date = date
+        self.text = text
+        self.message = text
+        self.entities = entities
+        self.reply_markup = reply_markup
+        self.file = file
+        self.document = document
+
+
+class FakeDialog:
+    def __init__(self, dialog_id: int, messages: List[FakeMessage]):
+        self.id = dialog_id
+        self.entity = dialog_id
+        self.messages = messages
+        self.message = messages[-1] if messages else None
+        self.date = self.message.date if self.message else None
+
+
+# ======================
+# Corpus
+# ======================
+
+def make_dialogs(scale: FakeScale) -> List[FakeDialog]:
+    rnd = random.Random(scale.seed)
+    now = datetime.now(timezone.utc)
+    span = timedelta(days=scale.history_days)
+
+    files: List[FakeFile] = []
+    doc_ids = iter(range(1, 10 ** 9))
+    dialogs = []
+
+    for d in range(scale.dialogs):
+        chat_id = -1000000000000 - d
+        messages = []
+
+        for i in range(1, scale.messages_per_dialog + 1):
+            date = now - span + span * i / (scale.messages_per_dialog + 1)
+            text = make_text(rnd, scale.link_ratio)
+            msg = FakeMessage(i, chat_id, date, text)
+
+            if rnd.random() < scale.entity_ratio:
+                msg.entities = _make_entities(rnd, msg)
+
+            if rnd.random() < scale.button_ratio:
+                msg.reply_markup = FakeReplyMarkup([
+                    FakeRow([FakeButton("انضم", make_link(rnd)), FakeButton("بدون رابط")]),
+                ])
+
+            if rnd.random() < scale.file_ratio:
+                if files and rnd.random() < scale.file_repeat_ratio:
+                    msg.file = rnd.choice(files)
+                else:
+                    msg.file = _make_file(rnd)
+                    files.append(msg.file)
+                msg.document = FakeDocument(next(doc_ids))
+
+            messages.append(msg)
+
+        dialogs.append(FakeDialog(chat_id, messages))
+
+    return dialogs
+
+
+def _make_entities(rnd: random.Random, msg: FakeMessage):
+    # رابط مخفي خلف كلمة + رابط ظاهر معلّم كـ entity
+    hidden = make_link(rnd)
+    label = "اضغط"
+    msg.text = msg.message = f"{label} {msg.text}"
+    entities = [MessageEntityTextUrl(offset=0, length=len(label), url=hidden)]
+
+    visible = make_link(rnd)
+    offset = len(msg.text) + 1
+    msg.text = msg.message = f"{msg.text} {visible}"
+    entities.append(MessageEntityUrl(offset=offset, length=len(visible)))
+    return entities
+
+
+def _make_file(rnd: random.Random) -> FakeFile:
+    lines = [make_text(rnd, 0.5) for _ in range(rnd.randint(5, 40))]
+    uri = make_link(rnd)
+
+    if rnd.random() < 0.5:
+        data = make_pdf_bytes(lines, uri, pages=rnd.randint(1, 5))
+        return FakeFile("file.pdf", PDF_MIME, data)
+
+    data = make_docx_bytes(lines, uri)
+    return FakeFile("file.docx", DOCX_MIME, data)
+
+
+# ======================
+# Fake Client
+# ======================
+
+class FakeTelegramClient:
+    """
+    نفس الواجهة التي يستخدمها collector / sender / file_extractors
+    """
+
+    def __init__(
+        self,
+        dialogs: List[FakeDialog],
+        network: Optional[FakeNetwork] = None,
+        me_id: int = 42,
+        targets: Optional[Dict[str, List[FakeMessage]]] = None,
+    ):
+        self.dialogs = dialogs
+        self.network = network or FakeNetwork()
+        self.me_id = me_id
+        self.targets = targets or {}
+        self._by_id = {d.id: d for d in dialogs}
+        self._handlers = []
+
+    # ---------- Connection ----------
+
+    async def connect(self):
+        await self._request()
+
+    def is_connected(self) -> bool:
+        return True
+
+    async def disconnect(self):
+        pass
+
+    async def is_user_authorized(self) -> bool:
+        return True
+
+    async def get_me(self):
+        await self._request()
+        return _Me(self.me_id)
+
+    # ---------- Events ----------
+
+    def add_event_handler(self, callback, event=None):
+        self._handlers.append(callback)
+
+    def remove_event_handler(self, callback, event=None):
+        if callback in self._handlers:
+            self._handlers.remove(callback)
+
+    # ---------- Reading ----------
+
+    async def iter_dialogs(self):
+        for i, dialog in enumerate(self.dialogs):
+            if i % PAGE_SIZE == 0:
+                await self._request()
+            yield dialog
+
+    async def iter_messages(
+        self,
+        entity,
+        limit: Optional[int] = None,
+        reverse: bool = False,
+        offset_date: Optional[datetime] = None,
+        min_id: int = 0,
+    ):
+        if isinstance(entity, str):
+            messages = self.targets.get(entity, [])
+        else:
+            messages = self._by_id[entity].messages
+
+        selected = [m for m in messages if m.id > min_id]
+        if offset_date is not None and reverse:
+            selected = [m for m in selected if m.date >= offset_date]
+        if not reverse:
+            selected.reverse()
+        if limit is not None:
+            selected = selected[:limit]
+
+        for i, message in enumerate(selected):
+            if i % PAGE_SIZE == 0:
+                await self._request()
+            yield message
+
+    async def download_media(self, message, file=None):
+        # تقريبًا طلب لكل 128KB
+        data = message.file.data
+        for _ in range(max(1, len(data) // (128 * 1024))):
+            await self._request()
+
+        if file is bytes:
+            return data
+
+        with open(file, "wb") as f:
+            f.write(data)
+        return file
+
+    # ---------- Sending ----------
+
+    async def send_message(self, entity, message, link_preview=True):
+        await self._request()
+        self.network.sent.append((entity, message))
+
+    # ---------- Network ----------
+
+    async def _request(self):
+        net = self.network
+        net.requests += 1
+
+        if net.latency_ms:
+            await asyncio.sleep(net.latency_ms / 1000)
+
+        if net.flood_every and net.requests % net.flood_every == 0:
+            net.floods += 1
+            raise FloodWaitError(None, capture=net.flood_seconds)
+
+
+class _Me:
+    def __init__(self, user_id: int):
+        self.id = user_id
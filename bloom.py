@@ -0,0 +1,59 @@
+import hashlib
+import math
+
+
+# ======================
+# Bloom Filter
+# ======================
+
+class BloomFilter:
+    """
+    مجموعة احتمالية صغيرة الحجم:
+    - "غير موجود" → مؤكد
+    - "موجود" → محتمل (بنسبة خطأ fp_rate عند الامتلاء المتوقع)
+    """
+
+    def __init__(self, expected_items: int, fp_rate: float):
+        expected_items = max(1, expected_items)
+        fp_rate = min(max(fp_rate, 1e-9), 0.5)
+
+        self.size = max(8, math.ceil(-expected_items * math.log(fp_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / expected_items * math.log(2)))
+        self.expected_items = expected_items
+
+        self._bits = bytearray((self.size + 7) // 8)
+        self._set_bits = 0
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            byte, bit = divmod(pos, 8)
+            mask = 1 << bit
+            if not self._bits[byte] & mask:
+                self._bits[byte] |= mask
+                self._set_bits += 1
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        for pos in self._positions(item):
+            byte, bit = divmod(pos, 8)
+            if not self._bits[byte] & (1 << bit):
+                return False
+        return True
+
+    def fill_ratio(self) -> float:
+        """
+        نسبة البتات المفعلة (فوق ~0.5 → حان وقت تكبير الحجم)
+        """
+        return self._set_bits / self.size
+
+    def estimated_fp_rate(self) -> float:
+        return self.fill_ratio() ** self.hash_count
@@ -1,6 +1,8 @@
 import asyncio
 import logging
 import os
+import time
+from io import BytesIO
 
 from telegram import (
     Update,
@@ -16,7 +18,7 @@ from telegram.ext import (
     filters,
 )
 
-from config import BOT_TOKEN
+from config import BOT_TOKEN, COLLECTOR_WORKERS
 from session_manager import (
     add_session,
     get_all_sessions,
@@ -28,11 +30,24 @@ from collector import (
     start_collection,
     stop_collection,
     is_collecting,
+    COLLECT_MODE_HISTORY,
+    COLLECT_MODE_LIVE,
+    COLLECT_MODE_CATCHUP,
+    get_pipeline_stats,
+    load_worker_metrics,
+)
+import metrics
+from clients import release_all_clients
+from workers import (
+    start_sharded_collection,
+    stop_sharded_collection,
+    is_sharded_collecting,
 )
 from database import (
     init_db,
     save_admin_target,
     get_admin_target,
+    get_dedup_bloom_stats,
 )
 
 # ======================
@@ -46,6 +61,13 @@ logger = logging.getLogger(__name__)
 # Keyboards
 # ======================
 
+COLLECT_MODE_LABELS = {
+    COLLECT_MODE_HISTORY: "التاريخ + الجديد",
+    COLLECT_MODE_LIVE: "الجديد فقط",
+    COLLECT_MODE_CATCHUP: "منذ آخر إيقاف",
+}
+
+
 def main_keyboard():
     return InlineKeyboardMarkup([
         [InlineKeyboardButton("➕ إضافة حساب", callback_data="add_account")],
@@ -60,8 +82,16 @@ def main_keyboard():
 
 def collect_choice_keyboard():
     return InlineKeyboardMarkup([
-        [InlineKeyboardButton("📞 واتساب فقط", callback_data="collect:whatsapp")],
-        [InlineKeyboardButton("📨 تليجرام فقط", callback_data="collect:telegram")],
+        [InlineKeyboardButton("📞 واتساب فقط", callback_data="collect:whatsapp:history")],
+        [InlineKeyboardButton("📨 تليجرام فقط", callback_data="collect:telegram:history")],
+        [
+            InlineKeyboardButton("⚡ واتساب - الجديد فقط", callback_data="collect:whatsapp:live"),
+            InlineKeyboardButton("⚡ تليجرام - الجديد فقط", callback_data="collect:telegram:live"),
+        ],
+        [
+            InlineKeyboardButton("⏩ واتساب - منذ آخر إيقاف", callback_data="collect:whatsapp:catchup"),
+            InlineKeyboardButton("⏩ تليجرام - منذ آخر إيقاف", callback_data="collect:telegram:catchup"),
+        ],
     ])
 
 # ======================
@@ -79,10 +109,97 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode="Markdown"
     )
 
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    /stats → ملخص الأداء
+    /stats prom → ملف بصيغة Prometheus
+    """
+    snap = _collect_metrics_snapshot()
+
+    if context.args and context.args[0].lower() in ("prom", "prometheus"):
+        document = BytesIO(metrics.render_prometheus(snap).encode("utf-8"))
+        document.name = "metrics.prom"
+        await update.message.reply_document(document)
+        return
+
+    await update.message.reply_text(_format_stats(snap))
+
+
+def _collect_metrics_snapshot() -> dict:
+    snapshots = [metrics.snapshot()]
+    if COLLECTOR_WORKERS > 1:
+        snapshots.extend(load_worker_metrics(COLLECTOR_WORKERS))
+    return metrics.merge_snapshots(snapshots)
+
+
+def _format_stats(snap: dict) -> str:
+    elapsed = max(1.0, time.time() - snap["started_at"])
+
+    def total(name: str, **labels) -> int:
+        return int(metrics.counter_total(snap, name, **labels))
+
+    scanned = total("messages_scanned_total")
+    extracted = total("links_extracted_total")
+
+    lines = [
+        "📊 إحصائيات الجمع",
+        f"⏱ منذ {int(elapsed // 60)} دقيقة",
+        "",
+        f"📨 رسائل مفحوصة: {scanned} ({scanned / elapsed:.1f}/ث)",
+        f"🔗 روابط مستخرجة: {extracted} "
+        f"(نص {total('links_extracted_total', source='text')} | "
+        f"ملفات {total('links_extracted_total', source='file')})",
+    ]
+
+    classified = metrics.counter_by(snap, "links_classified_total", "platform")
+    if classified:
+        lines.append("🏷 مصنفة: " + " | ".join(f"{k} {int(v)}" for k, v in sorted(classified.items())))
+
+    rejected = metrics.counter_by(snap, "links_rejected_total", "reason")
+    if rejected:
+        lines.append("🚫 مرفوضة: " + " | ".join(f"{k} {int(v)}" for k, v in sorted(rejected.items())))
+
+    lines += [
+        f"♻️ مكررة: {total('dedup_hits_total')} "
+        f"(Bloom وفّر {total('dedup_bloom_skips_total')} استعلام)",
+        f"📤 مرسلة: {total('links_sent_total')} رابط في {total('sends_total')} رسالة "
+        f"(أخطاء {total('send_errors_total')})",
+        f"🌊 FloodWait: {total('flood_wait_seconds_total')} ثانية",
+        f"📎 ملفات: {total('file_downloads_total')} تحميل "
+        f"({total('file_download_bytes_total') / 1024 / 1024:.1f} MB) | "
+        f"كاش {total('file_cache_hits_total')}/{total('file_cache_misses_total')}",
+    ]
+
+    for name, label in (
+        ("message_pipeline_seconds", "message pipeline"),
+        ("extract_links_from_file_seconds", "extract_links_from_file"),
+        ("send_unique_link_seconds", "_send_unique_link"),
+        ("file_parse_seconds", "file parse"),
+    ):
+        summary = metrics.histogram_summary(snap, name)
+        if summary:
+            lines.append(
+                f"⏲ {label}: n={summary['count']} avg={summary['avg'] * 1000:.1f}ms "
+                f"p50≤{summary['p50'] * 1000:g}ms p99≤{summary['p99'] * 1000:g}ms"
+            )
+
+    # الحالة اللحظية في هذا الـ Process فقط
+    for account, depths in get_pipeline_stats().items():
+        lines.append(f"📥 {account}: " + " | ".join(f"{k} {v}" for k, v in depths.items()))
+
+    for (_, platform), bloom in get_dedup_bloom_stats().items():
+        lines.append(f"🌸 Bloom {platform}: {bloom['items']} رابط، امتلاء {bloom['fill_ratio']:.1%}")
+
+    return "\n".join(lines)
+
 # ======================
 # Callbacks
 # ======================
 
+def _collection_running() -> bool:
+    return is_collecting() or is_sharded_collecting()
+
+
 async def callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -165,7 +282,7 @@ async def callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # ▶️ بدء الجمع
     elif data == "start_collect":
-        if is_collecting():
+        if _collection_running():
             await query.message.reply_text("⏳ الجمع يعمل بالفعل.")
             return
 
@@ -175,17 +292,30 @@ async def callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
     elif data.startswith("collect:"):
-        if is_collecting():
+        if _collection_running():
             await query.message.reply_text("⏳ الجمع يعمل بالفعل.")
             return
 
-        platform = data.split(":")[1]
-        asyncio.create_task(start_collection(platform=platform))
-        await query.message.reply_text(f"▶️ بدأ تجميع روابط {platform.upper()}")
+        parts = data.split(":")
+        platform = parts[1]
+        mode = parts[2] if len(parts) > 2 else COLLECT_MODE_HISTORY
+
+        if COLLECTOR_WORKERS > 1:
+            # كل عامل يفتح عملاءه: لا نُبقي نفس الجلسات متصلة هنا أيضًا
+            await release_all_clients()
+            start_sharded_collection(COLLECTOR_WORKERS, platform=platform, mode=mode)
+        else:
+            asyncio.create_task(start_collection(platform=platform, mode=mode))
+        await query.message.reply_text(
+            f"▶️ بدأ تجميع روابط {platform.upper()} ({COLLECT_MODE_LABELS.get(mode, mode)})"
+        )
 
     # ⏹ إيقاف الجمع
     elif data == "stop_collect":
         stop_collection()
+        if is_sharded_collecting():
+            await query.message.reply_text("⏳ جاري إيقاف عمال الجمع...")
+            await stop_sharded_collection()
         await query.message.reply_text("⏹ تم إيقاف الجمع.")
 
 # ======================
@@ -199,7 +329,7 @@ async def messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # إضافة Session
     if context.user_data.get("awaiting_session"):
         try:
-            add_session(text)
+            await add_session(text)
             await update.message.reply_text("✅ تم إضافة الحساب.")
         except Exception as e:
             await update.message.reply_text(f"❌ {e}")
@@ -229,6 +359,7 @@ def main():
     app = ApplicationBuilder().token(BOT_TOKEN).build()
 
     app.add_handler(CommandHandler("start", start))
+    app.add_handler(CommandHandler("stats", stats))
     app.add_handler(CallbackQueryHandler(callbacks))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, messages))
 
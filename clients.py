@@ -0,0 +1,186 @@
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from telethon import TelegramClient
+from telethon.errors import FloodWaitError
+from telethon.sessions import StringSession
+
+from config import API_ID, API_HASH
+
+# ======================
+# Logging
+# ======================
+
+logger = logging.getLogger(__name__)
+
+# ======================
+# Settings
+# ======================
+
+# فحص دوري للاتصال وإعادة الاتصال عند الحاجة
+HEALTH_CHECK_INTERVAL_SECONDS = 60
+HEALTH_CHECK_TIMEOUT_SECONDS = 15
+
+# ======================
+# Errors
+# ======================
+
+class SessionUnauthorizedError(Exception):
+    """
+    الجلسة لم تعد تملك صلاحية الدخول (ملغاة / منتهية)
+    """
+
+
+# ======================
+# Global State
+# ======================
+
+# عميل واحد طويل العمر لكل جلسة (session id → client)
+_clients: Dict[int, TelegramClient] = {}
+_locks: Dict[int, asyncio.Lock] = {}
+_health_task: Optional[asyncio.Task] = None
+
+
+# ======================
+# Public API
+# ======================
+
+async def get_client(session_id: int, session_string: str) -> TelegramClient:
+    """
+    العميل المتصل لهذه الجلسة (يُنشأ ويتصل مرة واحدة فقط)
+    """
+    lock = _locks.setdefault(session_id, asyncio.Lock())
+    async with lock:
+        client = _clients.get(session_id)
+
+        if client is None:
+            client = _new_client(session_string)
+            await client.connect()
+            _clients[session_id] = client
+            logger.info(f"Client connected: session {session_id}")
+
+        elif not client.is_connected():
+            await client.connect()
+
+    _ensure_health_loop()
+    return client
+
+
+async def open_validated_client(session_string: str) -> TelegramClient:
+    """
+    التحقق من أن Session String صالح ويملك صلاحية الدخول
+    يعيد العميل متصلاً ليُسجل لاحقًا بـ register_client بدل اتصال جديد
+    """
+    client = _new_client(session_string)
+
+    try:
+        await client.connect()
+
+        if not await client.is_user_authorized():
+            raise ValueError("Session غير صالح أو منتهي")
+
+    except ValueError:
+        await _safe_disconnect(client)
+        raise
+    except Exception:
+        await _safe_disconnect(client)
+        raise ValueError("Session String غير صحيح")
+
+    return client
+
+
+def register_client(session_id: int, client: TelegramClient):
+    _clients[session_id] = client
+    _ensure_health_loop()
+
+
+async def release_client(session_id: int):
+    """
+    فصل عميل الجلسة وإزالته (عند التعطيل / الحذف)
+    """
+    client = _clients.pop(session_id, None)
+    _locks.pop(session_id, None)
+
+    if client is not None:
+        await _safe_disconnect(client)
+        logger.info(f"Client released: session {session_id}")
+
+
+def release_client_nowait(session_id: int):
+    """
+    نفس release_client لكن من كود غير async
+    """
+    if session_id not in _clients:
+        return
+
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        _clients.pop(session_id, None)
+        _locks.pop(session_id, None)
+        return
+
+    loop.create_task(release_client(session_id))
+
+
+async def release_all_clients():
+    global _health_task
+
+    if _health_task is not None:
+        _health_task.cancel()
+        _health_task = None
+
+    for session_id in list(_clients):
+        await release_client(session_id)
+
+
+# ======================
+# Helpers
+# ======================
+
+def _new_client(session_string: str) -> TelegramClient:
+    return TelegramClient(
+        StringSession(session_string),
+        API_ID,
+        API_HASH
+    )
+
+
+async def _safe_disconnect(client: TelegramClient):
+    try:
+        await client.disconnect()
+    except Exception:
+        pass
+
+
+def _ensure_health_loop():
+    global _health_task
+    if _health_task is None or _health_task.done():
+        _health_task = asyncio.get_running_loop().create_task(_health_loop())
+
+
+async def _health_loop():
+    while _clients:
+        await asyncio.sleep(HEALTH_CHECK_INTERVAL_SECONDS)
+
+        for session_id, client in list(_clients.items()):
+            if client.is_connected():
+                # فحص فقط: FloodWait / مهلة لا تعني انقطاع الاتصال
+                # وإعادة الاتصال هنا تقطع iter_messages الجاري
+                try:
+                    await asyncio.wait_for(client.get_me(), HEALTH_CHECK_TIMEOUT_SECONDS)
+                except FloodWaitError as e:
+                    logger.info(f"Health check FloodWait {e.seconds}s (session {session_id}), skipped")
+                except Exception as e:
+                    logger.warning(f"Health check failed (session {session_id}): {e!r}")
+
+                # قد ينقطع الاتصال أثناء الفحص
+                if client.is_connected():
+                    continue
+
+            logger.warning(f"Client disconnected (session {session_id}), reconnecting")
+            try:
+                await client.connect()
+            except Exception as e:
+                logger.error(f"Reconnect failed (session {session_id}): {e}")
@@ -1,17 +1,75 @@
 import asyncio
+import json
 import logging
-from typing import List
+import time
+from collections import OrderedDict, deque
 from datetime import datetime, timezone, timedelta
+from typing import Callable
 
 from telethon import TelegramClient, events
-from telethon.sessions import StringSession
+from telethon.errors import (
+    FloodWaitError,
+    ServerError,
+    TimedOutError,
+    AuthKeyDuplicatedError,
+    AuthKeyUnregisteredError,
+    SessionExpiredError,
+    SessionRevokedError,
+    UserDeactivatedBanError,
+    UserDeactivatedError,
+)
 from telethon.tl.types import Message
 
-from config import API_ID, API_HASH
-from session_manager import get_all_sessions
-from database import get_admin_target
-from link_utils import extract_links_from_message, filter_and_classify_link
-from file_extractors import extract_links_from_file
+from config import (
+    HISTORY_LOOKBACK_DAYS,
+    DIALOG_CONCURRENCY,
+    PIPELINE_EXTRACT_WORKERS,
+    PIPELINE_FILE_WORKERS,
+    PIPELINE_CLASSIFY_WORKERS,
+    PIPELINE_QUEUE_SIZE,
+    TG_MESSAGE_LINK_WINDOW_DAYS,
+    DEDUP_BLOOM_EXPECTED_LINKS,
+    DEDUP_BLOOM_FP_RATE,
+    CLIENT_MAX_FAILURES,
+    CLIENT_MAX_FLOOD_WAIT_SECONDS,
+    METRICS_DUMP_PATH,
+    METRICS_FLUSH_SECONDS,
+)
+import metrics
+from session_manager import get_all_sessions, disable_session
+from clients import get_client, release_client, SessionUnauthorizedError
+from database import (
+    get_admin_target,
+    is_link_sent,
+    load_dedup_bloom,
+    dedup_bloom_might_contain,
+    get_dedup_bloom_stats,
+    mark_links_sent_bulk,
+    is_target_seeded,
+    mark_target_seeded,
+    get_scan_checkpoints,
+    save_scan_checkpoints,
+    claim_tg_message_link_chat,
+    get_tg_message_link_chat,
+    release_tg_message_link_chat,
+    prune_tg_message_link_chats,
+    get_collector_state,
+    set_collector_state,
+)
+from link_utils import (
+    extract_links_from_message,
+    classify_links,
+    classified_links,
+    link_from_key,
+)
+from file_extractors import extract_links_from_file, has_supported_file
+from sender import (
+    enqueue_link,
+    is_link_pending,
+    drain_senders,
+    get_send_queue_depth,
+    wait_send_flood,
+)
 
 # ======================
 # Logging
@@ -19,18 +77,92 @@ from file_extractors import extract_links_from_file
 
 logger = logging.getLogger(__name__)
 
+# ======================
+# Collect Modes
+# ======================
+
+# history: قراءة التاريخ (حسب النافذة ونقاط الاستئناف) + الرسائل الجديدة
+# live: الرسائل الجديدة فقط بدون قراءة أي تاريخ
+# catchup: التاريخ منذ آخر إيقاف فقط + الرسائل الجديدة
+COLLECT_MODE_HISTORY = "history"
+COLLECT_MODE_LIVE = "live"
+COLLECT_MODE_CATCHUP = "catchup"
+
+COLLECT_MODES = (COLLECT_MODE_HISTORY, COLLECT_MODE_LIVE, COLLECT_MODE_CATCHUP)
+
+LAST_STOPPED_AT_KEY = "last_stopped_at"
+
+# آخر snapshot للمقاييس من كل عامل (workers.py)
+WORKER_METRICS_KEY = "metrics:worker:{}"
+
 # ======================
 # Global State
 # ======================
 
-_clients: List[TelegramClient] = []
 _collecting: bool = False
 _stop_event = asyncio.Event()
 _selected_platform: str | None = None
 _collect_started_at_utc: datetime | None = None
+_history_cutoff_utc: datetime | None = None
+_collect_mode: str = COLLECT_MODE_HISTORY
+
+# لمنع أكثر من رابط رسالة تيليجرام لكل شات (لكل مشرف)
+# المصدر الدائم في قاعدة البيانات، وهنا كاش محدود الحجم (LRU)
+# (admin_id, chat_id) → (الرابط المحجوز، وقت الجمع)
+_tg_message_link_chats: OrderedDict[tuple[int, int], tuple[str, float]] = OrderedDict()
+
+TG_MESSAGE_LINK_CHATS_CACHE_SIZE = 50000
+
+# تعبئة فهرس التكرار من تاريخ القناة الهدف (مرة واحدة لكل قناة)
+_seed_locks: dict[tuple[int, str], asyncio.Lock] = {}
+_seed_failed: set[tuple[int, str, str]] = set()
+_seeded_targets: set[tuple[int, str, str]] = set()
+
+SEED_BATCH_SIZE = 500
+
+# حفظ نقاط الاستئناف كل N رسالة منتهية بدل commit لكل رسالة
+CHECKPOINT_FLUSH_EVERY = 200
+
+# أقصى رسائل تنتظر خلف أقدم رسالة لم تنته في نفس المحادثة
+# (إرسال فاشل يثبت نقطة الاستئناف) → جلب المحادثة يتوقف حتى تنتهي
+CHECKPOINT_MAX_INFLIGHT = 2000
+
+# عدد محاولات إعادة فحص محادثة بعد FloodWait
+DIALOG_FLOOD_RETRIES = 3
+
+# فوق هذه النسبة يجب تكبير DEDUP_BLOOM_EXPECTED_LINKS
+BLOOM_FILL_WARNING = 0.5
+
+# إعادة المحاولة بعد إخفاق العميل: تأخير أُسّي
+CLIENT_RETRY_BASE_SECONDS = 5
+CLIENT_RETRY_MAX_SECONDS = 300
+
+# أخطاء تعني أن الجلسة لن تعمل مرة أخرى → تعطيل مباشر
+AUTH_ERRORS = (
+    SessionUnauthorizedError,
+    AuthKeyDuplicatedError,
+    AuthKeyUnregisteredError,
+    SessionExpiredError,
+    SessionRevokedError,
+    UserDeactivatedBanError,
+    UserDeactivatedError,
+)
+
+# أقصى وقت لتفريغ طوابير الـ pipeline عند الإيقاف
+PIPELINE_DRAIN_TIMEOUT_SECONDS = 30
 
-# لمنع أكثر من رابط رسالة تيليجرام لكل شات
-_collected_one_tg_message_link_per_chat: set[str] = set()
+# أخطاء تحميل مؤقتة (شبكة / خادم): الرسالة لا تُعتبر منتهية → إعادة المحاولة
+# (أخطاء التحليل والمهلة تعني "بدون روابط" وتنتهي الرسالة)
+FILE_NETWORK_ERRORS = (ConnectionError, TimeoutError, ServerError, TimedOutError)
+FILE_RETRIES = 3
+FILE_RETRY_BASE_SECONDS = 2
+
+# فحص دوري للجلسات المعطلة / المحذوفة أثناء الجمع
+# (من البوت أو من Process آخر: التعطيل لا يصل لعميل عامل الجمع مباشرة)
+SESSION_WATCH_SECONDS = 30
+
+# pipeline لكل حساب (اسم الحساب → pipeline)
+_pipelines: dict[str, "_ClientPipeline"] = {}
 
 
 # ======================
@@ -41,70 +173,446 @@ def is_collecting() -> bool:
     return _collecting
 
 
+def get_pipeline_stats() -> dict[str, dict[str, int]]:
+    """
+    عمق الطابور لكل مرحلة ولكل حساب (لمعرفة المرحلة البطيئة)
+    """
+    return {name: p.depths() for name, p in _pipelines.items()}
+
+
+def load_worker_metrics(count: int) -> list[dict]:
+    """
+    آخر snapshot منشور من كل عامل جمع (COLLECTOR_WORKERS > 1)
+    """
+    snapshots = []
+    for index in range(count):
+        raw = get_collector_state(WORKER_METRICS_KEY.format(index))
+        if raw:
+            try:
+                snapshots.append(json.loads(raw))
+            except ValueError:
+                pass
+    return snapshots
+
+
+def clear_worker_metrics(count: int):
+    for index in range(count):
+        set_collector_state(WORKER_METRICS_KEY.format(index), "")
+
+
 def stop_collection():
     global _collecting
+    was_collecting = _collecting
     _collecting = False
     _stop_event.set()
+
+    # نقطة البداية لوضع catchup في التشغيل القادم
+    if was_collecting:
+        try:
+            set_collector_state(
+                LAST_STOPPED_AT_KEY,
+                datetime.now(timezone.utc).isoformat()
+            )
+        except Exception as e:
+            logger.error(f"State save error: {e}")
+
     logger.info("Collection stopped")
 
 
-async def start_collection(platform: str | None = None):
-    global _collecting, _clients, _selected_platform, _collect_started_at_utc
+async def start_collection(
+    platform: str | None = None,
+    lookback_days: int | None = None,
+    mode: str = COLLECT_MODE_HISTORY,
+    shard: tuple[int, int] | None = None
+):
+    """
+    shard = (index, count) → هذا الـ Process يشغل فقط الجلسات
+    التي id % count == index (انظر workers.py)
+    """
+    global _collecting, _selected_platform
+    global _collect_started_at_utc, _history_cutoff_utc, _collect_mode
 
     if _collecting:
         return
 
+    if mode not in COLLECT_MODES:
+        raise ValueError(f"Unknown collect mode: {mode}")
+
     sessions = get_all_sessions()
+    if shard:
+        index, count = shard
+        sessions = [s for s in sessions if s["id"] % count == index]
     if not sessions:
         return
 
     _selected_platform = platform
     _collect_started_at_utc = datetime.now(timezone.utc)
 
+    if lookback_days is None:
+        lookback_days = HISTORY_LOOKBACK_DAYS
+    _history_cutoff_utc = _collect_started_at_utc - timedelta(days=lookback_days)
+
+    # catchup: من آخر إيقاف فقط (وليس أقدم من النافذة)
+    if mode == COLLECT_MODE_CATCHUP:
+        last_stopped_at = _load_last_stopped_at()
+        if last_stopped_at and last_stopped_at > _history_cutoff_utc:
+            _history_cutoff_utc = last_stopped_at
+
+    _collect_mode = mode
+
     _collecting = True
     _stop_event.clear()
-    _clients = []
-    _collected_one_tg_message_link_per_chat.clear()
+    _seed_failed.clear()
 
-    tasks = [run_client(session) for session in sessions]
-    await asyncio.gather(*tasks)
+    if TG_MESSAGE_LINK_WINDOW_DAYS > 0:
+        _tg_message_link_chats.clear()
+        prune_tg_message_link_chats(time.time() - TG_MESSAGE_LINK_WINDOW_DAYS * 86400)
+
+    metrics_task = asyncio.create_task(_metrics_loop(shard))
+
+    # كل حساب معزول: فشل أحدها لا يوقف الباقي
+    tasks = {
+        session["id"]: asyncio.create_task(_supervise_client(session))
+        for session in sessions
+    }
+    watch_task = asyncio.create_task(_watch_sessions(tasks))
+
+    try:
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+    finally:
+        watch_task.cancel()
+        metrics_task.cancel()
+        _publish_metrics(shard)
 
 
 # ======================
 # Client Runner
 # ======================
 
-async def run_client(session_data: dict):
-    session_string = session_data["session"]
+async def _supervise_client(session_data: dict):
+    """
+    تشغيل حساب واحد مع إعادة المحاولة (تأخير أُسّي)
+    - أخطاء الصلاحية → تعطيل الجلسة مباشرة
+    - FloodWait قصير → انتظار بدون احتساب إخفاق
+    - بعد CLIENT_MAX_FAILURES إخفاقات متتالية → تعطيل الجلسة
+      (العداد يُصفّر بعد كل اتصال ناجح)
+    - FloodWait طويل (من الاتصال / الفحص / الإرسال) يُحسب في عداد منفصل
+      لا يُصفّره الاتصال الناجح: جلسة عالقة في FloodWait تُعطل أيضًا
+    """
+    session_id = session_data["id"]
     account_name = session_data["name"]
+    failures = 0
+    long_floods = 0
 
-    client = TelegramClient(
-        StringSession(session_string),
-        API_ID,
-        API_HASH
-    )
+    def on_ready():
+        nonlocal failures
+        failures = 0
 
-    await client.connect()
-    _clients.append(client)
-    logger.info(f"Client started: {account_name}")
+    while _collecting:
+        try:
+            await run_client(session_data, on_ready)
+            return
 
-    @client.on(events.NewMessage)
-    async def new_message_handler(event):
+        except AUTH_ERRORS as e:
+            _disable_failed_session(session_id, account_name, f"Auth error: {e}")
+            return
+
+        except FloodWaitError as e:
+            metrics.inc("flood_wait_seconds_total", e.seconds, stage="client")
+            if e.seconds <= CLIENT_MAX_FLOOD_WAIT_SECONDS:
+                logger.warning(f"{account_name}: FloodWait {e.seconds}s, waiting")
+                await _sleep_unless_stopped(e.seconds)
+                continue
+
+            failures += 1
+            long_floods += 1
+            error = f"FloodWait {e.seconds}s"
+
+        except Exception as e:
+            failures += 1
+            error = str(e) or type(e).__name__
+
+        attempts = max(failures, long_floods)
+        if attempts >= CLIENT_MAX_FAILURES:
+            _disable_failed_session(
+                session_id,
+                account_name,
+                f"{attempts} consecutive failures: {error}"
+            )
+            return
+
+        delay = min(CLIENT_RETRY_MAX_SECONDS, CLIENT_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+        logger.error(f"{account_name}: {error}, retry {attempts}/{CLIENT_MAX_FAILURES} in {delay}s")
+        await _sleep_unless_stopped(delay)
+
+
+async def _watch_sessions(tasks: dict[int, asyncio.Task]):
+    """
+    إيقاف الحسابات التي عُطلت / حُذفت أثناء الجمع وفصل عملائها
+    """
+    while _collecting and tasks:
+        await _sleep_unless_stopped(SESSION_WATCH_SECONDS)
         if not _collecting:
             return
-        await process_message(event.message, client)
 
-    async for dialog in client.iter_dialogs():
         try:
-            async for message in client.iter_messages(dialog.entity, reverse=True):
-                if not _collecting:
-                    return
-                await process_message(message, client)
+            active = {s["id"] for s in get_all_sessions()}
         except Exception as e:
-            logger.error(f"Dialog error: {e}")
+            logger.error(f"Session watch error: {e}")
+            continue
 
-    await _stop_event.wait()
-    await client.disconnect()
+        for session_id in [i for i in tasks if i not in active]:
+            task = tasks.pop(session_id)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+            # المشرف قد يكون أعاد الاتصال بعد التعطيل
+            await release_client(session_id)
+            logger.info(f"Session {session_id} no longer active, stopped")
+
+
+def _disable_failed_session(session_id: int, account_name: str, reason: str):
+    logger.error(f"{account_name}: disabled ({reason})")
+    try:
+        disable_session(session_id, reason)
+    except Exception as e:
+        logger.error(f"Disable session error: {e}")
+
+
+async def _sleep_unless_stopped(seconds: float):
+    try:
+        await asyncio.wait_for(_stop_event.wait(), timeout=seconds)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def _wait_unless_stopped(event: asyncio.Event):
+    waiters = [
+        asyncio.create_task(event.wait()),
+        asyncio.create_task(_stop_event.wait()),
+    ]
+    try:
+        await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for w in waiters:
+            w.cancel()
+
+
+async def run_client(session_data: dict, on_ready: Callable[[], None] | None = None):
+    """
+    on_ready يُستدعى بعد الاتصال والتحقق من الصلاحية (لتصفير عداد الإخفاقات)
+    """
+    account_name = session_data["name"]
+
+    # عميل طويل العمر من السجل: بدون إعادة اتصال بين مرات الجمع
+    client = await get_client(session_data["id"], session_data["session"])
+
+    if not await client.is_user_authorized():
+        raise SessionUnauthorizedError("Session غير صالح أو منتهي")
+
+    # 🔑 تحديد المشرف (مالك الجلسة) مرة واحدة لكل عميل
+    me = await client.get_me()
+    admin_id = me.id
+    logger.info(f"Client started: {account_name}")
+
+    if on_ready is not None:
+        on_ready()
+
+    _load_dedup_blooms(admin_id)
+
+    pipeline = _ClientPipeline(client, admin_id, account_name)
+    _pipelines[account_name] = pipeline
+
+    async def new_message_handler(event):
+        if not _collecting:
+            return
+        await pipeline.submit(event.message)
+
+    client.add_event_handler(new_message_handler, events.NewMessage)
+
+    checkpoints = None
+    if _collect_mode != COLLECT_MODE_LIVE:
+        checkpoints = _ScanCheckpoints(session_data["id"])
+
+    async def collect():
+        # ========= History =========
+        if checkpoints is not None:
+            await _scan_history(client, checkpoints, pipeline)
+
+        await _stop_event.wait()
+
+    collect_task = asyncio.create_task(collect())
+    send_flood_task = asyncio.create_task(wait_send_flood(admin_id))
+
+    try:
+        # FloodWait طويل في الإرسال يوقف التشغيل (كما في الفحص)
+        done, _ = await asyncio.wait(
+            {collect_task, send_flood_task},
+            return_when=asyncio.FIRST_COMPLETED
+        )
+        if send_flood_task in done:
+            raise send_flood_task.result()
+        collect_task.result()
+
+    finally:
+        collect_task.cancel()
+        send_flood_task.cancel()
+        await asyncio.gather(collect_task, send_flood_task, return_exceptions=True)
+
+        # العميل يبقى متصلاً، فقط نزيل معالج هذا التشغيل
+        client.remove_event_handler(new_message_handler, events.NewMessage)
+        await pipeline.close()
+        _pipelines.pop(account_name, None)
+        await drain_senders(admin_id)
+
+        # بعد التفريغ: ما انتهى أثناء الإغلاق يُحفظ، والباقي يُعاد فحصه
+        if checkpoints is not None:
+            checkpoints.flush()
+
+
+async def _scan_history(
+    client: TelegramClient,
+    checkpoints: "_ScanCheckpoints",
+    pipeline: "_ClientPipeline"
+):
+    """
+    مرحلة الجلب: فحص تاريخ المحادثات عبر مجموعة عمال محدودة (DIALOG_CONCURRENCY)
+    - الرسائل تُسلم للـ pipeline (تنتظر فقط إذا امتلأ الطابور)
+    - كل محادثة تُستأنف من نقطة الاستئناف الخاصة بها
+      (تتقدم عند انتهاء الرسالة من الـ pipeline، وليس عند دخولها الطابور)
+    - عند FloodWait يتوقف كل العمال حتى انتهاء المهلة ثم يُعاد فحص المحادثة
+    - FloodWait أطول من CLIENT_MAX_FLOOD_WAIT_SECONDS أو خطأ صلاحية (AUTH_ERRORS)
+      → يتوقف الفحص ويُرفع الخطأ لمشرف الحسابات (بعد انتهاء العمال، ونقاط الاستئناف محفوظة)
+    """
+    loop = asyncio.get_running_loop()
+    flood_until = 0.0
+    # خطأ يوقف الفحص ويُرفع لمشرف الحسابات
+    fatal: Exception | None = None
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=DIALOG_CONCURRENCY * 2)
+
+    def on_flood(e: FloodWaitError):
+        nonlocal flood_until, fatal
+        if e.seconds > CLIENT_MAX_FLOOD_WAIT_SECONDS:
+            if fatal is None or (isinstance(fatal, FloodWaitError) and e.seconds > fatal.seconds):
+                fatal = e
+            checkpoints.wake_all()
+            return
+
+        flood_until = max(flood_until, loop.time() + e.seconds)
+        metrics.inc("flood_wait_seconds_total", e.seconds, stage="history")
+        logger.warning(f"FloodWait {e.seconds}s, pausing dialog workers")
+
+    def on_auth_error(e: Exception):
+        nonlocal fatal
+        # الصلاحية أهم من FloodWait: الجلسة تُعطل بدل إعادة المحاولة
+        if not isinstance(fatal, AUTH_ERRORS):
+            fatal = e
+        checkpoints.wake_all()
+
+    async def wait_flood():
+        # الإيقاف يقطع الانتظار: لا يبقى فحص قديم يعمل بعد بدء تشغيل جديد
+        delay = min(flood_until - loop.time(), CLIENT_MAX_FLOOD_WAIT_SECONDS)
+        if delay > 0:
+            await _sleep_unless_stopped(delay)
+
+    async def scan_dialog(dialog):
+        for _ in range(DIALOG_FLOOD_RETRIES + 1):
+            await wait_flood()
+            if not _collecting or fatal:
+                return
+
+            last_id = checkpoints.resume_from(dialog.id)
+
+            # لا توجد رسائل جديدة منذ آخر فحص
+            if last_id and dialog.message and dialog.message.id <= last_id:
+                return
+
+            try:
+                # نطلب فقط الرسائل بعد تاريخ القطع وبعد نقطة الاستئناف
+                async for message in client.iter_messages(
+                    dialog.entity,
+                    reverse=True,
+                    offset_date=_history_cutoff_utc,
+                    min_id=last_id
+                ):
+                    if not _collecting or fatal:
+                        return
+
+                    await checkpoints.wait_room(dialog.id)
+                    if not _collecting or fatal:
+                        return
+
+                    work = checkpoints.track(dialog.id, message.id)
+                    if _skip_old_messages(message.date):
+                        work.done()
+                    else:
+                        await pipeline.submit(message, work)
+                return
+            except FloodWaitError as e:
+                on_flood(e)
+
+        logger.error(f"Dialog skipped after FloodWait retries: {dialog.id}")
+
+    async def worker():
+        while True:
+            dialog = await queue.get()
+            if dialog is None:
+                return
+            if not _collecting or fatal:
+                continue  # تفريغ الطابور فقط
+            try:
+                await scan_dialog(dialog)
+            except AUTH_ERRORS as e:
+                on_auth_error(e)
+            except Exception as e:
+                logger.error(f"Dialog error: {e}")
+
+    workers = [asyncio.create_task(worker()) for _ in range(DIALOG_CONCURRENCY)]
+    seen: set[int] = set()
+
+    try:
+        for _ in range(DIALOG_FLOOD_RETRIES + 1):
+            try:
+                async for dialog in client.iter_dialogs():
+                    if not _collecting or fatal:
+                        break
+                    if dialog.id in seen:
+                        continue
+                    seen.add(dialog.id)
+
+                    # آخر رسالة في المحادثة أقدم من تاريخ القطع: لا يوجد شيء داخل النافذة
+                    if _skip_old_messages(dialog.date):
+                        continue
+
+                    await queue.put(dialog)
+                break
+            except FloodWaitError as e:
+                on_flood(e)
+                await wait_flood()
+                if not _collecting or fatal:
+                    break
+            except AUTH_ERRORS as e:
+                on_auth_error(e)
+                break
+
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+
+        if fatal is not None:
+            raise fatal
+
+    except (FloodWaitError, *AUTH_ERRORS):
+        raise
+
+    except Exception as e:
+        logger.error(f"Dialogs error: {e}")
+
+    finally:
+        for w in workers:
+            w.cancel()
+        checkpoints.flush()
 
 
 # ======================
@@ -119,104 +627,599 @@ def _to_utc(dt: datetime) -> datetime:
     return dt.astimezone(timezone.utc)
 
 
+def _load_last_stopped_at() -> datetime | None:
+    value = get_collector_state(LAST_STOPPED_AT_KEY)
+    if not value:
+        return None
+    try:
+        return _to_utc(datetime.fromisoformat(value))
+    except ValueError:
+        return None
+
+
 def _skip_old_messages(message_date: datetime) -> bool:
-    if not _collect_started_at_utc or not message_date:
+    if not _history_cutoff_utc or not message_date:
         return False
 
-    return _to_utc(message_date) < (_collect_started_at_utc - timedelta(days=60))
+    return _to_utc(message_date) < _history_cutoff_utc
 
 
-def _should_skip_tg_message_link(chat_id: int | None, platform: str) -> bool:
-    if platform != "telegram" or not chat_id:
-        return False
+def _load_dedup_blooms(admin_id: int):
+    for platform in ("telegram", "whatsapp"):
+        bloom = load_dedup_bloom(
+            admin_id,
+            platform,
+            DEDUP_BLOOM_EXPECTED_LINKS,
+            DEDUP_BLOOM_FP_RATE
+        )
+
+        fill = bloom.fill_ratio()
+        logger.info(f"Dedup bloom {platform}: {bloom.count} links, fill {fill:.1%}")
+        if fill > BLOOM_FILL_WARNING:
+            logger.warning(
+                f"Dedup bloom {platform} is {fill:.0%} full, "
+                "increase DEDUP_BLOOM_EXPECTED_LINKS"
+            )
+
+
+def _count_scanned(message: Message, account_name: str):
+    metrics.inc("messages_scanned_total", session=account_name)
+    # أكثر المحادثات فقط (عدد المحادثات غير محدود)
+    metrics.inc_top("dialog_messages_scanned", "dialog", message.chat_id, session=account_name)
 
-    key = str(chat_id)
-    if key in _collected_one_tg_message_link_per_chat:
-        return True
 
-    _collected_one_tg_message_link_per_chat.add(key)
-    return False
+async def _metrics_loop(shard: tuple[int, int] | None):
+    while _collecting:
+        await _sleep_unless_stopped(METRICS_FLUSH_SECONDS)
+        _publish_metrics(shard)
 
 
-async def _link_exists_in_channel(client: TelegramClient, chat: str, link: str) -> bool:
+def _update_metric_gauges():
+    for account_name, depths in get_pipeline_stats().items():
+        for stage, depth in depths.items():
+            metrics.set_gauge("pipeline_queue_depth", depth, session=account_name, stage=stage)
+
+    for (admin_id, platform), stats in get_dedup_bloom_stats().items():
+        metrics.set_gauge("dedup_bloom_fill_ratio", stats["fill_ratio"], admin=admin_id, platform=platform)
+        metrics.set_gauge("dedup_bloom_items", stats["items"], admin=admin_id, platform=platform)
+
+
+def _publish_metrics(shard: tuple[int, int] | None):
     """
-    فحص التكرار من آخر 200 رسالة في القناة
+    - عامل (shard): نشر snapshot في قاعدة البيانات ليجمعها البوت
+      والعامل 0 يكتب ملف Prometheus المجمع لكل العمال
+    - بدون shard: كتابة ملف Prometheus مباشرة (إذا METRICS_DUMP_PATH مضبوط)
     """
     try:
-        async for msg in client.iter_messages(chat, limit=200):
-            if msg.text and link in msg.text:
-                return True
-    except Exception:
-        pass
+        _update_metric_gauges()
+        snap = metrics.snapshot()
+
+        if shard:
+            index, count = shard
+            set_collector_state(WORKER_METRICS_KEY.format(index), json.dumps(snap))
+            if index != 0:
+                return
+            snap = metrics.merge_snapshots(load_worker_metrics(count))
+
+        if METRICS_DUMP_PATH:
+            metrics.write_prometheus(METRICS_DUMP_PATH, snap)
+
+    except Exception as e:
+        logger.error(f"Metrics publish error: {e}")
+
+
+def _claim_tg_message_link_chat(
+    admin_id: int,
+    chat_id: int,
+    link: str
+) -> tuple[bool, bool]:
+    """
+    رابط رسالة تيليجرام واحد لكل (مشرف، شات)
+
+    Returns:
+        (allowed, claimed)
+        allowed → الرابط يكمل للإرسال (الشات متاح، أو محجوز لنفس الرابط)
+        claimed → تم الحجز الآن (يُلغى إذا لم يدخل الرابط طابور الإرسال)
+    """
+    key = (admin_id, chat_id)
+    now = time.time()
+    window = TG_MESSAGE_LINK_WINDOW_DAYS * 86400
+
+    cached = _tg_message_link_chats.get(key)
+    if cached is not None and (not window or now - cached[1] < window):
+        _tg_message_link_chats.move_to_end(key)
+        return cached[0] == link, False
+
+    # الحجز في قاعدة البيانات (مشترك بين كل عمال الجمع)
+    if claim_tg_message_link_chat(admin_id, chat_id, link, now, (now - window) if window else None):
+        _remember_tg_message_link_chat(key, link, now)
+        return True, True
+
+    holder = get_tg_message_link_chat(admin_id, chat_id)
+    if holder is None:
+        return False, False
+
+    _remember_tg_message_link_chat(key, *holder)
+    return holder[0] == link, False
+
+
+def _release_tg_message_link_chat(admin_id: int, chat_id: int, link: str):
+    _tg_message_link_chats.pop((admin_id, chat_id), None)
+    release_tg_message_link_chat(admin_id, chat_id, link)
+
+
+def _remember_tg_message_link_chat(key: tuple[int, int], link: str, collected_at: float):
+    _tg_message_link_chats[key] = (link, collected_at)
+    _tg_message_link_chats.move_to_end(key)
+
+    while len(_tg_message_link_chats) > TG_MESSAGE_LINK_CHATS_CACHE_SIZE:
+        _tg_message_link_chats.popitem(last=False)
+
+
+async def _ensure_dedup_seeded(
+    client: TelegramClient,
+    admin_id: int,
+    platform: str,
+    target_chat: str
+):
+    """
+    تعبئة فهرس التكرار من التاريخ الكامل للقناة الهدف
+    - تتم مرة واحدة فقط لكل (مشرف، منصة، قناة)
+    - بعدها يتم الفحص محليًا بدون أي طلب شبكة
+    """
+    key = (admin_id, platform, target_chat)
+    if key in _seeded_targets or key in _seed_failed:
+        return
+
+    if is_target_seeded(admin_id, platform, target_chat):
+        _seeded_targets.add(key)
+        return
+
+    lock = _seed_locks.setdefault((admin_id, platform), asyncio.Lock())
+    async with lock:
+        if is_target_seeded(admin_id, platform, target_chat):
+            _seeded_targets.add(key)
+            return
+
+        batch: list[str] = []
+        try:
+            async for msg in client.iter_messages(target_chat):
+                # نفس الشكل الذي يُرسل (مبني من مفتاح التصنيف)
+                batch.extend(classified_links(extract_links_from_message(msg), canonical=True))
+                if len(batch) >= SEED_BATCH_SIZE:
+                    mark_links_sent_bulk(admin_id, platform, batch)
+                    batch.clear()
+        except Exception as e:
+            # نحتفظ بما تمت قراءته ونعيد المحاولة في الجمع القادم
+            mark_links_sent_bulk(admin_id, platform, batch)
+            _seed_failed.add(key)
+            logger.error(f"Dedup seed error ({target_chat}): {e}")
+            return
 
-    return False
+        mark_links_sent_bulk(admin_id, platform, batch)
+        mark_target_seeded(admin_id, platform, target_chat)
+        _seeded_targets.add(key)
+        logger.info(f"Dedup index seeded: {target_chat}")
 
 
 async def _send_unique_link(
     client: TelegramClient,
+    admin_id: int,
+    platform: str,
     target_chat: str,
-    link: str
-):
-    if not await _link_exists_in_channel(client, target_chat, link):
-        await client.send_message(target_chat, link)
-        return True
-    return False
+    link: str,
+    work: "_MessageWork | None" = None
+) -> bool:
+    """
+    True → دخل طابور الإرسال (work ينتهي بعد إرساله فعليًا)
+    """
+    with metrics.timed("send_unique_link_seconds"):
+        await _ensure_dedup_seeded(client, admin_id, platform, target_chat)
+
+        if is_link_pending(admin_id, platform, link):
+            metrics.inc("dedup_hits_total", platform=platform, layer="pending")
+            return False
+
+        # Bloom: "غير موجود" مؤكد → بدون استعلام قاعدة البيانات
+        if dedup_bloom_might_contain(admin_id, platform, link):
+            if is_link_sent(admin_id, platform, link):
+                metrics.inc("dedup_hits_total", platform=platform, layer="index")
+                return False
+        else:
+            metrics.inc("dedup_bloom_skips_total", platform=platform)
+
+        # الإرسال عبر طابور القناة (تجميع + معدل + FloodWait) بدون انتظار
+        queued = await enqueue_link(
+            client, admin_id, platform, target_chat, link,
+            work.done if work else None
+        )
+        if queued and work:
+            work.add()
+        return queued
 
 
 # ======================
-# Message Processing
+# Scan Checkpoints
 # ======================
 
-async def process_message(message: Message, client: TelegramClient):
-    if not message:
-        return
+class _MessageWork:
+    """
+    الأعمال المتبقية لرسالة داخل الـ pipeline:
+    الاستخراج + الملف + كل رابط حتى إرساله (أو رفضه)
+    started_at → وقت دخول الـ pipeline (message_pipeline_seconds عند الانتهاء)
+    """
 
-    # ========= Text =========
-    links = extract_links_from_message(message)
+    __slots__ = ("message_id", "pending", "started_at", "_on_done")
 
-    for link in links:
-        await _handle_link(link, message, client)
+    def __init__(self, message_id: int, on_done=None):
+        self.message_id = message_id
+        self.pending = 1
+        self.started_at: float | None = None
+        self._on_done = on_done
 
-    # ========= Files =========
-    if message.file:
-        if _skip_old_messages(message.date):
+    def add(self):
+        self.pending += 1
+
+    def done(self):
+        self.pending -= 1
+        if self.pending:
+            return
+
+        if self.started_at is not None:
+            metrics.observe("message_pipeline_seconds", time.perf_counter() - self.started_at)
+        if self._on_done:
+            self._on_done()
+
+
+class _ScanCheckpoints:
+    """
+    نقاط الاستئناف لجلسة واحدة
+    نقطة المحادثة = آخر رسالة انتهت هي وكل ما قبلها من الـ pipeline
+    → الإيقاف / انتهاء مهلة التفريغ / قتل الـ Process لا يتخطى رسائل لم تُعالج
+    """
+
+    def __init__(self, session_id: int):
+        self.session_id = session_id
+        self._saved = get_scan_checkpoints(session_id)
+        self._dirty: dict[int, int] = {}
+        # آخر رسالة سُلمت للـ pipeline (لإعادة الفحص بعد FloodWait بدون تكرار)
+        self._scanned: dict[int, int] = {}
+        # الرسائل بالترتيب (reverse=True → تصاعدي) حتى تنتهي
+        self._inflight: dict[int, deque] = {}
+        # محادثات متوقفة بانتظار تقدم نقطة الاستئناف
+        self._room: dict[int, asyncio.Event] = {}
+        self._completed = 0
+
+    def resume_from(self, dialog_id: int) -> int:
+        return max(
+            self._saved.get(dialog_id, 0),
+            self._dirty.get(dialog_id, 0),
+            self._scanned.get(dialog_id, 0),
+        )
+
+    async def wait_room(self, dialog_id: int):
+        """
+        ذاكرة محدودة: الرسالة الأقدم لم تنته (مثلاً إرسال فاشل) → لا نجلب المزيد
+        من هذه المحادثة حتى تنتهي أو يتوقف الجمع
+        """
+        works = self._inflight.get(dialog_id)
+        if works is None or len(works) < CHECKPOINT_MAX_INFLIGHT:
+            return
+
+        logger.warning(
+            f"Dialog {dialog_id} paused: {len(works)} messages waiting "
+            f"behind message {works[0].message_id}"
+        )
+        event = self._room.setdefault(dialog_id, asyncio.Event())
+        event.clear()
+        await _wait_unless_stopped(event)
+
+    def wake_all(self):
+        """
+        إيقاف الفحص (خطأ يُرفع لمشرف الحسابات): المحادثات المتوقفة لا تنتظر
+        """
+        for event in self._room.values():
+            event.set()
+        self._room.clear()
+
+    def track(self, dialog_id: int, message_id: int) -> _MessageWork:
+        work = _MessageWork(message_id, lambda: self._advance(dialog_id))
+        self._inflight.setdefault(dialog_id, deque()).append(work)
+        self._scanned[dialog_id] = message_id
+        return work
+
+    def flush(self):
+        if not self._dirty:
             return
 
         try:
-            file_links = await extract_links_from_file(client, message)
-            for link in file_links:
-                await _handle_link(link, message, client)
+            save_scan_checkpoints(self.session_id, self._dirty)
+            self._saved.update(self._dirty)
+            self._dirty.clear()
         except Exception as e:
-            logger.error(f"File extract error: {e}")
+            logger.error(f"Checkpoint save error: {e}")
 
+    def _advance(self, dialog_id: int):
+        works = self._inflight[dialog_id]
+        while works and works[0].pending == 0:
+            self._dirty[dialog_id] = works.popleft().message_id
+            self._completed += 1
 
-async def _handle_link(link: str, message: Message, client: TelegramClient):
-    classified = filter_and_classify_link(link)
-    if not classified:
-        return
+        if not works:
+            del self._inflight[dialog_id]
 
-    platform, _ = classified
+        event = self._room.get(dialog_id)
+        if event is not None and len(works) < CHECKPOINT_MAX_INFLIGHT:
+            del self._room[dialog_id]
+            event.set()
 
-    # فقط واتساب / تليجرام
-    if platform not in ("whatsapp", "telegram"):
-        return
+        # حفظ كل N رسالة منتهية بدل commit لكل رسالة
+        if self._completed >= CHECKPOINT_FLUSH_EVERY:
+            self._completed = 0
+            self.flush()
 
-    # حسب اختيار الزر
-    if _selected_platform and platform != _selected_platform:
-        return
 
-    if _skip_old_messages(message.date):
-        return
+# ======================
+# Pipeline
+# ======================
+
+class _ClientPipeline:
+    """
+    مراحل المعالجة لكل حساب، بينها طوابير محدودة:
+
+    fetch → [messages] → extract → [files] → file extract
+                              ↘         ↙
+                               [links] → classify / dedup → publish (sender)
+
+    كل مرحلة لها عدد عمال خاص، والطابور الممتلئ يبطئ المرحلة السابقة فقط
+    """
+
+    def __init__(self, client: TelegramClient, admin_id: int, account_name: str):
+        self.client = client
+        self.admin_id = admin_id
+        self.account_name = account_name
+
+        self.messages: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        self.files: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        self.links: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+
+        self._tasks = (
+            [asyncio.create_task(self._extract_worker()) for _ in range(PIPELINE_EXTRACT_WORKERS)]
+            + [asyncio.create_task(self._file_worker()) for _ in range(PIPELINE_FILE_WORKERS)]
+            + [asyncio.create_task(self._classify_worker()) for _ in range(PIPELINE_CLASSIFY_WORKERS)]
+        )
+
+    async def submit(self, message: Message, work: _MessageWork | None = None):
+        """
+        work → يتتبع انتهاء الرسالة (نقاط الاستئناف)، بدونه للرسائل الجديدة
+        """
+        if not message:
+            return
+        _count_scanned(message, self.account_name)
+
+        work = work or _MessageWork(message.id)
+        work.started_at = time.perf_counter()
+        await self.messages.put((message, work))
+
+    def depths(self) -> dict[str, int]:
+        return {
+            "messages": self.messages.qsize(),
+            "files": self.files.qsize(),
+            "links": self.links.qsize(),
+            "publish": get_send_queue_depth(self.admin_id),
+        }
+
+    async def close(self):
+        """
+        تفريغ الطوابير بالترتيب ثم إيقاف العمال
+        """
+        try:
+            await asyncio.wait_for(self._join(), timeout=PIPELINE_DRAIN_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning(f"Pipeline drain timed out: {self.depths()}")
+        finally:
+            for task in self._tasks:
+                task.cancel()
+
+    async def _join(self):
+        await self.messages.join()
+        await self.files.join()
+        await self.links.join()
+
+    # كل مرحلة تضيف عملاً قبل تسليم الرسالة للمرحلة التالية وتنهي عملها بعد النجاح
+    # خطأ / إلغاء → الرسالة لا تنتهي ونقطة الاستئناف تبقى قبلها
+
+    async def _extract_worker(self):
+        while True:
+            message, work = await self.messages.get()
+            try:
+                links = extract_links_from_message(message)
+                metrics.inc("links_extracted_total", len(links), source="text")
+
+                for link, platform, chat_type in _classify(links):
+                    work.add()
+                    await self.links.put((link, platform, chat_type, message, work))
+
+                if _has_collectable_file(message):
+                    work.add()
+                    await self.files.put((message, work))
+
+                work.done()
+            except Exception as e:
+                logger.error(f"Extract stage error: {e}")
+            finally:
+                self.messages.task_done()
+
+    async def _file_worker(self):
+        while True:
+            message, work = await self.files.get()
+            try:
+                links = await self._download_file_links(message)
+                if links is None:
+                    # لم يُحمّل: الرسالة تبقى غير منتهية → نقطة الاستئناف لا تتخطاها
+                    continue
+
+                for link, platform, chat_type in _classify(links):
+                    work.add()
+                    await self.links.put((link, platform, chat_type, message, work))
+
+                work.done()
+            except Exception as e:
+                logger.error(f"File stage error: {e}")
+            finally:
+                self.files.task_done()
+
+    async def _download_file_links(self, message: Message) -> list[str] | None:
+        """
+        FloodWait / أخطاء الشبكة → انتظار ثم إعادة المحاولة (مثل عمال الفحص)
+        None → لم يُحمّل الملف (إيقاف / FloodWait طويل / انتهت المحاولات)
+        """
+        for attempt in range(FILE_RETRIES + 1):
+            if not _collecting:
+                return None
+
+            try:
+                return await _extract_file_links(self.client, message)
+
+            except FloodWaitError as e:
+                metrics.inc("flood_wait_seconds_total", e.seconds, stage="file")
+                if e.seconds > CLIENT_MAX_FLOOD_WAIT_SECONDS:
+                    logger.warning(f"File FloodWait {e.seconds}s, message {message.id} left pending")
+                    return None
+                logger.warning(f"File FloodWait {e.seconds}s, waiting")
+                await _sleep_unless_stopped(e.seconds)
+
+            except FILE_NETWORK_ERRORS as e:
+                metrics.inc("file_errors_total", kind="network")
+                logger.warning(f"File download error: {e!r}, retry {attempt + 1}/{FILE_RETRIES}")
+                await _sleep_unless_stopped(FILE_RETRY_BASE_SECONDS * 2 ** attempt)
+
+        logger.error(f"File download failed, message {message.id} left pending")
+        return None
+
+    async def _classify_worker(self):
+        while True:
+            link, platform, chat_type, message, work = await self.links.get()
+            try:
+                await _handle_link(link, platform, chat_type, message, self.client, self.admin_id, work)
+                work.done()
+            except Exception as e:
+                logger.error(f"Classify stage error: {e}")
+            finally:
+                self.links.task_done()
+
+
+# ======================
+# Message Processing
+# ======================
 
-    if _should_skip_tg_message_link(message.chat_id, platform):
+async def process_message(message: Message, client: TelegramClient, admin_id: int):
+    """
+    معالجة رسالة كاملة بالتسلسل (نفس مراحل الـ pipeline بدون طوابير)
+    """
+    if not message:
         return
 
-    # 🔑 تحديد المشرف (مالك الجلسة)
-    me = await client.get_me()
-    admin_id = me.id
+    with metrics.timed("process_message_seconds"):
+        # ========= Text =========
+        links = extract_links_from_message(message)
+        metrics.inc("links_extracted_total", len(links), source="text")
+
+        for link, platform, chat_type in _classify(links):
+            await _handle_link(link, platform, chat_type, message, client, admin_id)
+
+        # ========= Files =========
+        if _has_collectable_file(message):
+            links = await _extract_file_links(client, message)
+            for link, platform, chat_type in _classify(links):
+                await _handle_link(link, platform, chat_type, message, client, admin_id)
+
+
+def _has_collectable_file(message: Message) -> bool:
+    # نوع غير مدعوم / حجم أكبر من الحد → لا يدخل طابور الملفات أصلاً
+    return has_supported_file(message) and not _skip_old_messages(message.date)
+
+
+async def _extract_file_links(client: TelegramClient, message: Message) -> list[str]:
+    """
+    FloodWait وأخطاء الشبكة تُرفع (الملف لم يُحمّل)، وغيرها = بدون روابط
+    """
+    try:
+        with metrics.timed("extract_links_from_file_seconds"):
+            links = await extract_links_from_file(client, message)
+    except (FloodWaitError, *FILE_NETWORK_ERRORS):
+        raise
+    except Exception as e:
+        metrics.inc("file_errors_total")
+        logger.error(f"File extract error: {e}")
+        return []
+
+    metrics.inc("links_extracted_total", len(links), source="file")
+    return links
+
+
+def _classify(links: list[str]) -> list[tuple[str, str, str]]:
+    """
+    تصنيف روابط الرسالة دفعة واحدة + فلتر المنصة قبل الطابور
+    الروابط هنا بالشكل الموحد مسبقًا، والناتج مبني من مفتاح التصنيف
+    (نفس الرابط لمنع التكرار والإرسال مهما اختلفت الأشكال الأصلية)
+    """
+    classified = classify_links(links, canonical=True)
+
+    rejected = len(links) - len(classified)
+    if rejected:
+        metrics.inc("links_rejected_total", rejected, reason="unclassified")
+
+    accepted = []
+    seen: set[str] = set()
+    for platform, chat_type, key in classified.values():
+        link = link_from_key(platform, chat_type, key)
+        if link in seen:
+            continue
+        seen.add(link)
+
+        metrics.inc("links_classified_total", platform=platform, type=chat_type)
+
+        # حسب اختيار الزر
+        if _selected_platform and platform != _selected_platform:
+            metrics.inc("links_rejected_total", reason="platform_filter")
+            continue
+
+        accepted.append((link, platform, chat_type))
+
+    return accepted
+
+
+async def _handle_link(
+    link: str,
+    platform: str,
+    chat_type: str,
+    message: Message,
+    client: TelegramClient,
+    admin_id: int,
+    work: _MessageWork | None = None
+):
+    if _skip_old_messages(message.date):
+        metrics.inc("links_rejected_total", reason="old")
+        return
 
     target_chat = get_admin_target(admin_id, platform)
     if not target_chat:
+        metrics.inc("links_rejected_total", reason="no_target")
         return  # لم يتم تعيين قناة
 
-    await _send_unique_link(client, target_chat, link)
+    chat_id = message.chat_id
+    claimed = False
+    if platform == "telegram" and chat_type == "message" and chat_id:
+        allowed, claimed = _claim_tg_message_link_chat(admin_id, chat_id, link)
+        if not allowed:
+            metrics.inc("links_rejected_total", reason="tg_message_per_chat")
+            return
+
+    queued = False
+    try:
+        queued = await _send_unique_link(client, admin_id, platform, target_chat, link, work)
+    finally:
+        # مكرر / في الطابور / خطأ → الشات يبقى متاحًا لرابط آخر
+        if claimed and not queued:
+            _release_tg_message_link_chat(admin_id, chat_id, link)
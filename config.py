@@ -22,6 +22,51 @@ DATABASE_PATH = os.getenv(
     "data/database.db"
 )
 
+# ======================
+# Collector
+# ======================
+
+# عدد الأيام التي يتم قراءتها من تاريخ كل محادثة (قابل للتغيير لكل تشغيل)
+HISTORY_LOOKBACK_DAYS = int(os.getenv("HISTORY_LOOKBACK_DAYS", "60"))
+
+# عدد المحادثات التي يتم فحصها بالتوازي لكل حساب
+DIALOG_CONCURRENCY = max(1, int(os.getenv("DIALOG_CONCURRENCY", "4")))
+
+# رابط رسالة تيليجرام واحد لكل شات خلال هذه النافذة (0 = بدون انتهاء)
+TG_MESSAGE_LINK_WINDOW_DAYS = int(os.getenv("TG_MESSAGE_LINK_WINDOW_DAYS", "0"))
+
+# Bloom filter أمام فهرس التكرار: العدد المتوقع للروابط لكل (مشرف، منصة) ونسبة الخطأ
+DEDUP_BLOOM_EXPECTED_LINKS = int(os.getenv("DEDUP_BLOOM_EXPECTED_LINKS", "500000"))
+DEDUP_BLOOM_FP_RATE = float(os.getenv("DEDUP_BLOOM_FP_RATE", "0.001"))
+
+# مراحل الـ pipeline: عدد العمال لكل مرحلة + سعة الطوابير (backpressure)
+PIPELINE_EXTRACT_WORKERS = max(1, int(os.getenv("PIPELINE_EXTRACT_WORKERS", "2")))
+PIPELINE_FILE_WORKERS = max(1, int(os.getenv("PIPELINE_FILE_WORKERS", "2")))
+PIPELINE_CLASSIFY_WORKERS = max(1, int(os.getenv("PIPELINE_CLASSIFY_WORKERS", "1")))
+PIPELINE_QUEUE_SIZE = max(1, int(os.getenv("PIPELINE_QUEUE_SIZE", "500")))
+
+# عدد Processes الجمع (الجلسات تُوزع بينها حسب id) - 1 = داخل Process البوت
+COLLECTOR_WORKERS = max(1, int(os.getenv("COLLECTOR_WORKERS", "1")))
+
+# مشرف الحسابات: عدد الإخفاقات المتتالية قبل تعطيل الجلسة تلقائيًا
+CLIENT_MAX_FAILURES = max(1, int(os.getenv("CLIENT_MAX_FAILURES", "5")))
+
+# FloodWait أطول من هذا (بالثواني) يُحسب إخفاق بدل الانتظار
+CLIENT_MAX_FLOOD_WAIT_SECONDS = int(os.getenv("CLIENT_MAX_FLOOD_WAIT_SECONDS", "600"))
+
+# أقل فاصل (بالثواني) بين رسالتين لنفس القناة الهدف
+SEND_MIN_INTERVAL_SECONDS = float(os.getenv("SEND_MIN_INTERVAL_SECONDS", "3"))
+
+# ======================
+# Metrics
+# ======================
+
+# ملف Prometheus (textfile) يُحدث دوريًا أثناء الجمع - فارغ = بدون ملف
+METRICS_DUMP_PATH = os.getenv("METRICS_DUMP_PATH", "").strip()
+
+# كل كم ثانية تُنشر المقاييس (الملف + snapshot عمال الجمع)
+METRICS_FLUSH_SECONDS = max(1, int(os.getenv("METRICS_FLUSH_SECONDS", "30")))
+
 # ======================
 # Validation
 # ======================
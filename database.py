@@ -1,19 +1,25 @@
-import sqlite3
-import os
-from typing import Optional
+import json
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from config import DATABASE_PATH
+from bloom import BloomFilter
+from storage import get_connection, init_storage
 
 
 # ======================
-# Connection
+# Cache
 # ======================
 
-def get_connection():
-    return sqlite3.connect(
-        DATABASE_PATH,
-        check_same_thread=False
-    )
+# كاش قنوات المشرفين في الذاكرة (يُبطل عند الحفظ)
+# مع مدة صلاحية: الحفظ قد يحدث في Process آخر (البوت / عمال الجمع)
+_admin_targets_cache: Dict[Tuple[int, str], Tuple[Optional[str], float]] = {}
+
+ADMIN_TARGET_CACHE_TTL_SECONDS = 60
+
+# Bloom filter لكل (مشرف، منصة) أمام فهرس التكرار
+# كل رابط يُسجل في sent_links يُضاف هنا أيضًا
+_dedup_blooms: Dict[Tuple[int, str], BloomFilter] = {}
 
 
 # ======================
@@ -22,35 +28,15 @@ def get_connection():
 
 def init_db():
     """
-    قاعدة البيانات الآن مخصصة فقط لـ:
+    قاعدة البيانات الآن مخصصة لـ:
     - تخزين قنوات / قروبات كل مشرف
-    - لا تخزين روابط
-    """
-
-    dir_name = os.path.dirname(DATABASE_PATH)
-    if dir_name:
-        os.makedirs(dir_name, exist_ok=True)
-
-    conn = get_connection()
-    cur = conn.cursor()
+    - فهرس منع التكرار (الروابط المرسلة لكل مشرف / منصة)
+    - نقاط استئناف الفحص
 
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS admin_targets (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            admin_id INTEGER NOT NULL,
-            platform TEXT NOT NULL,
-            target_chat TEXT NOT NULL,
-            UNIQUE(admin_id, platform)
-        )
-    """)
-
-    cur.execute("""
-        CREATE INDEX IF NOT EXISTS idx_admin_targets_admin
-        ON admin_targets (admin_id)
-    """)
+    الجداول نفسها تُنشأ في storage (مرة واحدة عند التشغيل)
+    """
 
-    conn.commit()
-    conn.close()
+    init_storage()
 
 
 # ======================
@@ -74,14 +60,21 @@ def save_admin_target(admin_id: int, platform: str, target_chat: str):
     """, (admin_id, platform, target_chat))
 
     conn.commit()
-    conn.close()
+
+    _admin_targets_cache.pop((admin_id, platform), None)
 
 
 def get_admin_target(admin_id: int, platform: str) -> Optional[str]:
     """
     جلب قناة / قروب المشرف لمنصة معينة
+    (من الكاش إن وجد، بما في ذلك عدم التعيين)
     """
 
+    key = (admin_id, platform)
+    cached = _admin_targets_cache.get(key)
+    if cached and time.monotonic() - cached[1] < ADMIN_TARGET_CACHE_TTL_SECONDS:
+        return cached[0]
+
     conn = get_connection()
     cur = conn.cursor()
 
@@ -93,6 +86,448 @@ def get_admin_target(admin_id: int, platform: str) -> Optional[str]:
     """, (admin_id, platform))
 
     row = cur.fetchone()
-    conn.close()
+
+    target = row[0] if row else None
+    _admin_targets_cache[key] = (target, time.monotonic())
+    return target
+
+
+# ======================
+# Dedup Index
+# ======================
+
+def is_link_sent(admin_id: int, platform: str, link: str) -> bool:
+    """
+    هل تم إرسال الرابط مسبقًا لقناة هذا المشرف؟
+    (بحث بالمفتاح الأساسي بدون أي طلب شبكة)
+    """
+
+    conn = get_connection()
+    cur = conn.cursor()
+
+    cur.execute("""
+        SELECT 1
+        FROM sent_links
+        WHERE admin_id = ? AND platform = ? AND link = ?
+        LIMIT 1
+    """, (admin_id, platform, link))
+
+    row = cur.fetchone()
+
+    return row is not None
+
+
+def mark_links_sent_bulk(admin_id: int, platform: str, links: Iterable[str]):
+    """
+    تسجيل مجموعة روابط دفعة واحدة (تُستخدم عند تعبئة الفهرس من تاريخ القناة)
+    """
+
+    sent_at = datetime.utcnow().isoformat()
+    rows = [(admin_id, platform, link, sent_at) for link in links if link]
+    if not rows:
+        return
+
+    conn = get_connection()
+    cur = conn.cursor()
+
+    cur.executemany("""
+        INSERT OR IGNORE INTO sent_links (admin_id, platform, link, sent_at)
+        VALUES (?, ?, ?, ?)
+    """, rows)
+
+    conn.commit()
+
+    bloom = _dedup_blooms.get((admin_id, platform))
+    if bloom is not None:
+        for row in rows:
+            bloom.add(row[2])
+
+
+def claim_links(admin_id: int, platform: str, links: Iterable[str]) -> List[str]:
+    """
+    حجز الروابط قبل الإرسال (ذري بين عدة Processes)
+    يعيد فقط الروابط التي لم يسبق تسجيلها
+    """
+
+    sent_at = datetime.utcnow().isoformat()
+    claimed: List[str] = []
+
+    conn = get_connection()
+    cur = conn.cursor()
+
+    for link in links:
+        cur.execute("""
+            INSERT OR IGNORE INTO sent_links (admin_id, platform, link, sent_at)
+            VALUES (?, ?, ?, ?)
+        """, (admin_id, platform, link, sent_at))
+        if cur.rowcount == 1:
+            claimed.append(link)
+
+    conn.commit()
+
+    bloom = _dedup_blooms.get((admin_id, platform))
+    if bloom is not None:
+        for link in claimed:
+            bloom.add(link)
+
+    return claimed
+
+
+def release_links(admin_id: int, platform: str, links: Iterable[str]):
+    """
+    إلغاء الحجز عند فشل الإرسال (لتُجمع مرة أخرى لاحقًا)
+    """
+
+    rows = [(admin_id, platform, link) for link in links]
+    if not rows:
+        return
+
+    conn = get_connection()
+    cur = conn.cursor()
+
+    cur.executemany("""
+        DELETE FROM sent_links
+        WHERE admin_id = ? AND platform = ? AND link = ?
+    """, rows)
+
+    conn.commit()
+
+
+def load_dedup_bloom(
+    admin_id: int,
+    platform: str,
+    expected_items: int,
+    fp_rate: float
+) -> BloomFilter:
+    """
+    بناء Bloom filter من كل الروابط المسجلة (مرة واحدة عند التشغيل)
+    """
+
+    key = (admin_id, platform)
+    if key in _dedup_blooms:
+        return _dedup_blooms[key]
+
+    bloom = BloomFilter(expected_items, fp_rate)
+
+    conn = get_connection()
+    cur = conn.cursor()
+
+    cur.execute("""
+        SELECT link
+        FROM sent_links
+        WHERE admin_id = ? AND platform = ?
+    """, (admin_id, platform))
+
+    for (link,) in cur:
+        bloom.add(link)
+
+    _dedup_blooms[key] = bloom
+    return bloom
+
+
+def dedup_bloom_might_contain(admin_id: int, platform: str, link: str) -> bool:
+    """
+    False → الرابط غير مسجل بالتأكيد (بدون استعلام)
+    True → يجب الفحص في sent_links (أو لا يوجد Bloom لهذا المشرف)
+    """
+
+    bloom = _dedup_blooms.get((admin_id, platform))
+    return bloom is None or link in bloom
+
+
+def get_dedup_bloom_stats() -> Dict[Tuple[int, str], Dict[str, float]]:
+    return {
+        key: {
+            "items": bloom.count,
+            "expected_items": bloom.expected_items,
+            "fill_ratio": bloom.fill_ratio(),
+            "estimated_fp_rate": bloom.estimated_fp_rate(),
+        }
+        for key, bloom in _dedup_blooms.items()
+    }
+
+
+def is_target_seeded(admin_id: int, platform: str, target_chat: str) -> bool:
+    """
+    هل تمت تعبئة الفهرس من تاريخ القناة الهدف؟
+    """
+
+    conn = get_connection()
+    cur = conn.cursor()
+
+    cur.execute("""
+        SELECT 1
+        FROM dedup_seeded_targets
+        WHERE admin_id = ? AND platform = ? AND target_chat = ?
+        LIMIT 1
+    """, (admin_id, platform, target_chat))
+
+    row = cur.fetchone()
+
+    return row is not None
+
+
+def mark_target_seeded(admin_id: int, platform: str, target_chat: str):
+    """
+    تعليم القناة الهدف كمُعبأة (تتم التعبئة مرة واحدة فقط)
+    """
+
+    conn = get_connection()
+    cur = conn.cursor()
+
+    cur.execute("""
+        INSERT OR REPLACE INTO dedup_seeded_targets
+        (admin_id, platform, target_chat, seeded_at)
+        VALUES (?, ?, ?, ?)
+    """, (admin_id, platform, target_chat, datetime.utcnow().isoformat()))
+
+    conn.commit()
+
+
+# ======================
+# Scan Checkpoints
+# ======================
+
+def get_scan_checkpoints(session_id: int) -> Dict[int, int]:
+    """
+    جلب نقاط الاستئناف لجلسة
+    → {dialog_id: last_message_id}
+    """
+
+    conn = get_connection()
+    cur = conn.cursor()
+
+    cur.execute("""
+        SELECT dialog_id, last_message_id
+        FROM scan_checkpoints
+        WHERE session_id = ?
+    """, (session_id,))
+
+    rows = cur.fetchall()
+
+    return {r[0]: r[1] for r in rows}
+
+
+def save_scan_checkpoints(session_id: int, checkpoints: Dict[int, int]):
+    """
+    حفظ نقاط الاستئناف دفعة واحدة (commit واحد لكل دفعة)
+    لا يتم الرجوع للخلف أبدًا
+    """
+
+    if not checkpoints:
+        return
+
+    updated_at = datetime.utcnow().isoformat()
+    rows = [
+        (session_id, dialog_id, message_id, updated_at)
+        for dialog_id, message_id in checkpoints.items()
+    ]
+
+    conn = get_connection()
+    cur = conn.cursor()
+
+    cur.executemany("""
+        INSERT INTO scan_checkpoints
+        (session_id, dialog_id, last_message_id, updated_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(session_id, dialog_id)
+        DO UPDATE SET
+            last_message_id = MAX(last_message_id, excluded.last_message_id),
+            updated_at = excluded.updated_at
+    """, rows)
+
+    conn.commit()
+
+
+# ======================
+# File Link Cache
+# ======================
+
+def get_cached_file_links(cache_key: str) -> Optional[List[str]]:
+    """
+    جلب روابط ملف سبق تحليله (وتحديث وقت آخر استخدام لـ LRU)
+    """
+
+    conn = get_connection()
+    cur = conn.cursor()
+
+    cur.execute("""
+        SELECT links
+        FROM file_link_cache
+        WHERE cache_key = ?
+    """, (cache_key,))
+
+    row = cur.fetchone()
+    if not row:
+        return None
+
+    cur.execute("""
+        UPDATE file_link_cache
+        SET last_used_at = ?
+        WHERE cache_key = ?
+    """, (time.time(), cache_key))
+
+    conn.commit()
+
+    return json.loads(row[0])
+
+
+def save_cached_file_links(
+    cache_keys: Iterable[str],
+    links: Iterable[str],
+    size: int,
+    max_entries: int
+):
+    """
+    حفظ روابط ملف تحت عدة مفاتيح (معرف الملف / hash المحتوى)
+    مع حذف الأقدم استخدامًا عند تجاوز الحد
+    """
+
+    payload = json.dumps(sorted(links))
+    now = time.time()
+    rows = [(key, payload, size, now) for key in cache_keys if key]
+    if not rows:
+        return
+
+    conn = get_connection()
+    cur = conn.cursor()
+
+    cur.executemany("""
+        INSERT OR REPLACE INTO file_link_cache
+        (cache_key, links, size, last_used_at)
+        VALUES (?, ?, ?, ?)
+    """, rows)
+
+    cur.execute("""
+        DELETE FROM file_link_cache
+        WHERE cache_key IN (
+            SELECT cache_key
+            FROM file_link_cache
+            ORDER BY last_used_at DESC
+            LIMIT -1 OFFSET ?
+        )
+    """, (max_entries,))
+
+    conn.commit()
+
+
+# ======================
+# Telegram Message Link Chats
+# ======================
+
+def claim_tg_message_link_chat(
+    admin_id: int,
+    chat_id: int,
+    link: str,
+    collected_at: float,
+    expired_before: Optional[float] = None
+) -> bool:
+    """
+    حجز الشات لرابط رسالة لهذا المشرف (ذري بين عدة Processes)
+    True → لم يُجمع منه رابط (أو انتهت نافذته) وتم الحجز الآن
+    """
+
+    conn = get_connection()
+    cur = conn.cursor()
+
+    cur.execute("""
+        INSERT INTO tg_message_link_chats (admin_id, chat_id, link, collected_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(admin_id, chat_id)
+        DO UPDATE SET link = excluded.link, collected_at = excluded.collected_at
+        WHERE tg_message_link_chats.collected_at < ?
+    """, (
+        admin_id,
+        chat_id,
+        link,
+        collected_at,
+        expired_before if expired_before is not None else float("-inf"),
+    ))
+
+    claimed = cur.rowcount == 1
+    conn.commit()
+
+    return claimed
+
+
+def get_tg_message_link_chat(admin_id: int, chat_id: int) -> Optional[Tuple[str, float]]:
+    """
+    الرابط المحجوز للشات ووقت حجزه (إن وجد)
+    """
+
+    conn = get_connection()
+    cur = conn.cursor()
+
+    cur.execute("""
+        SELECT link, collected_at
+        FROM tg_message_link_chats
+        WHERE admin_id = ? AND chat_id = ?
+    """, (admin_id, chat_id))
+
+    row = cur.fetchone()
+
+    return (row[0], row[1]) if row else None
+
+
+def release_tg_message_link_chat(admin_id: int, chat_id: int, link: str):
+    """
+    إلغاء الحجز عندما لا يدخل الرابط طابور الإرسال (مكرر / في الطابور)
+    """
+
+    conn = get_connection()
+    cur = conn.cursor()
+
+    cur.execute("""
+        DELETE FROM tg_message_link_chats
+        WHERE admin_id = ? AND chat_id = ? AND link = ?
+    """, (admin_id, chat_id, link))
+
+    conn.commit()
+
+
+def prune_tg_message_link_chats(older_than: float):
+    """
+    حذف الشاتات خارج النافذة الزمنية
+    """
+
+    conn = get_connection()
+    cur = conn.cursor()
+
+    cur.execute(
+        "DELETE FROM tg_message_link_chats WHERE collected_at < ?",
+        (older_than,)
+    )
+
+    conn.commit()
+
+
+# ======================
+# Collector State
+# ======================
+
+def get_collector_state(key: str) -> Optional[str]:
+    conn = get_connection()
+    cur = conn.cursor()
+
+    cur.execute(
+        "SELECT value FROM collector_state WHERE key = ?",
+        (key,)
+    )
+
+    row = cur.fetchone()
 
     return row[0] if row else None
+
+
+def set_collector_state(key: str, value: str):
+    conn = get_connection()
+    cur = conn.cursor()
+
+    cur.execute("""
+        INSERT INTO collector_state (key, value)
+        VALUES (?, ?)
+        ON CONFLICT(key)
+        DO UPDATE SET value = excluded.value
+    """, (key, value))
+
+    conn.commit()
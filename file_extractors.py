@@ -1,10 +1,29 @@
+import asyncio
+import hashlib
+import importlib.util
+import io
+import logging
+import multiprocessing
 import os
-from typing import List, Set
+import tempfile
+import time
+import weakref
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from io import BytesIO
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
 
 from telethon import TelegramClient
 from telethon.tl.types import Message
 
-from link_utils import URL_REGEX, BARE_URL_REGEX, DOMAIN_URL_REGEX, _normalize_url
+import metrics
+from link_utils import extract_urls_from_text, classify_link, _normalize_url
+from database import get_cached_file_links, save_cached_file_links
 
 
 # ======================
@@ -18,172 +37,905 @@ LOCAL_TMP_DIR = "data/tmp_files"
 MAX_FILE_SIZE_MB = 15  # غيرها مثل ما تبغى
 MAX_FILE_SIZE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
 
+# ✅ الملفات حتى هذا الحجم تُحمّل للذاكرة، والأكبر منها فقط يُكتب على القرص
+SPILL_TO_DISK_MB = 5
+SPILL_TO_DISK_BYTES = SPILL_TO_DISK_MB * 1024 * 1024
+
+PDF_MIME = "application/pdf"
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+PPTX_MIME = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+
+# ✅ تحليل الملفات خارج الـ event loop (Process Pool)
+PARSE_WORKERS = max(1, min(4, os.cpu_count() or 1))
+MAX_CONCURRENT_PARSES = PARSE_WORKERS  # عدد الملفات التي تُحلل بنفس الوقت
+PARSE_TIMEOUT_SECONDS = 60  # مهلة تحليل الملف الواحد (الافتراضية لكل نوع)
+
+# ✅ كاش روابط الملفات المُحللة (LRU) - الحد الأقصى لعدد المفاتيح
+FILE_CACHE_MAX_ENTRIES = 20000
+
+# ✅ PDF: حدود الصفحات والوقت + التوقف المبكر إذا لم توجد روابط في أول الصفحات (0 = بدون)
+PDF_MAX_PAGES = 300
+PDF_TIME_BUDGET_SECONDS = 40  # أقل من مهلة التحليل: نعيد ما جُمع بدل لا شيء
+PDF_EARLY_STOP_PAGES = 10
+
+# ✅ النصوص تُقرأ على دفعات (بدون تحميل الملف كله كنص واحد)
+TEXT_CHUNK_CHARS = 256 * 1024
+MAX_LINK_CHARS = 4096  # أطول ذيل يُحمل بين دفعتين (رابط مقطوع بين الدفعات)
+
+# ✅ حدود فك الضغط (ZIP + ملفات OOXML) ضد zip bombs
+ZIP_MAX_MEMBERS = 200
+ZIP_MAX_MEMBER_BYTES = 20 * 1024 * 1024
+ZIP_MAX_TOTAL_BYTES = 50 * 1024 * 1024
+ZIP_MAX_RATIO = 100  # الحجم بعد الفك / الحجم المضغوط (ملفات ZIP فقط، وليس أجزاء OOXML)
+
+# ✅ QR في الصور (اختياري: pip install pyzbar pillow + مكتبة zbar)
+QR_ENABLED = True
+QR_MAX_FILE_SIZE_BYTES = 5 * 1024 * 1024
+QR_MAX_PIXELS = 40_000_000
+QR_MAX_SIDE = 2000
+
+
+# مصدر الملف: bytes (من الذاكرة) أو مسار على القرص
+FileSource = Union[bytes, str]
+
+
+logger = logging.getLogger(__name__)
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_parse_semaphore: Optional[asyncio.Semaphore] = None
+
+# Pools قُتلت بعد انتهاء مهلة (التحليلات الأخرى فيها تُعاد مرة واحدة)
+_killed_pools: "weakref.WeakSet[ProcessPoolExecutor]" = weakref.WeakSet()
+
+
+# ======================
+# Extractor Registry
+# ======================
+
+@dataclass(frozen=True)
+class FileExtractor:
+    """
+    نوع ملف مدعوم:
+    - parser: دالة على مستوى الـ module (تعمل داخل Process التحليل)
+    - max_size_bytes: الملفات الأكبر لا تُحمّل أصلاً
+    - timeout_seconds: مهلة التحليل لهذا النوع
+    """
+    name: str
+    parser: Callable[[FileSource], List[str]]
+    extensions: Tuple[str, ...]
+    mime_types: Tuple[str, ...]
+    max_size_bytes: int = MAX_FILE_SIZE_BYTES
+    timeout_seconds: float = PARSE_TIMEOUT_SECONDS
+
+
+_by_extension: Dict[str, FileExtractor] = {}
+_by_mime: Dict[str, FileExtractor] = {}
+
+
+def register_extractor(extractor: FileExtractor):
+    for ext in extractor.extensions:
+        _by_extension[ext.lower()] = extractor
+    for mime in extractor.mime_types:
+        _by_mime[mime.lower()] = extractor
+
+
+def find_extractor(filename: Optional[str], mime: Optional[str]) -> Optional[FileExtractor]:
+    """
+    الامتداد أولاً (mime من تيليجرام غالبًا عام مثل octet-stream) ثم mime
+    """
+    ext = os.path.splitext((filename or "").lower())[1]
+    if ext in _by_extension:
+        return _by_extension[ext]
+    return _by_mime.get((mime or "").lower().split(";", 1)[0].strip())
+
 
 # ======================
 # Public API
 # ======================
 
+def has_supported_file(message: Message) -> bool:
+    """
+    هل يوجد ملف من نوع مدعوم وضمن الحد المسموح؟ (بدون أي تحميل)
+    """
+    return _select_extractor(message) is not None
+
+
 async def extract_links_from_file(
     client: TelegramClient,
     message: Message
 ) -> List[str]:
     """
     استخراج الروابط من الملفات بدون ما يضغط /tmp على Render
-    - PDF
-    - DOCX
+    الأنواع المدعومة في سجل المحللات (PDF / DOCX / نصوص / HTML / XLSX / PPTX / ZIP / QR)
     """
     if not message.file:
         return []
 
-    # ✅ Skip large files (مهم جداً)
-    try:
-        if getattr(message.file, "size", 0) and message.file.size > MAX_FILE_SIZE_BYTES:
-            return []
-    except Exception:
-        pass
+    # ✅ تحديد النوع والحجم قبل التحميل (الأنواع الأخرى لا يتم تحميلها أصلاً)
+    extractor = _select_extractor(message, count_skips=True)
+    if extractor is None:
+        return []
 
-    links: Set[str] = set()
+    size = getattr(message.file, "size", 0) or 0
 
-    filename = message.file.name or "file"
-    mime = (message.file.mime_type or "").lower()
+    # ✅ نفس الملف (نفس document / photo id) سبق تحليله: بدون تحميل ولا تحليل
+    doc_key = _media_cache_key(message, size)
+    if doc_key:
+        cached = get_cached_file_links(doc_key)
+        if cached is not None:
+            metrics.inc("file_cache_hits_total", key="document")
+            return cached
 
-    # ✅ إذا بدون امتداد نحدد حسب mime
-    if "." not in filename.lower():
-        if mime == "application/pdf":
-            filename += ".pdf"
-        elif mime == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-            filename += ".docx"
+    metrics.inc("file_downloads_total", type=extractor.name)
+    metrics.inc("file_download_bytes_total", size, type=extractor.name)
 
-    # ✅ مجلد تحميل محلي بدل /tmp
-    os.makedirs(LOCAL_TMP_DIR, exist_ok=True)
-    path = os.path.join(LOCAL_TMP_DIR, filename)
+    # ✅ الملفات الصغيرة تُحمّل للذاكرة مباشرة (بدون قرص)
+    if size and size <= SPILL_TO_DISK_BYTES:
+        with metrics.timed("file_download_seconds", storage="memory"):
+            data = await client.download_media(message, file=bytes)
+        if not data:
+            return []
 
-    # لو الاسم يتكرر نغيره
-    base, ext = os.path.splitext(path)
-    i = 1
-    while os.path.exists(path):
-        path = f"{base}_{i}{ext}"
-        i += 1
+        content_key = "sha256:" + hashlib.sha256(data).hexdigest()
+        links = await _parse_cached(extractor, data, doc_key, content_key, size)
+
+    # ✅ الملفات الكبيرة فقط تُكتب على القرص (اسم فريد بدون سباق)
+    else:
+        os.makedirs(LOCAL_TMP_DIR, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix=extractor.extensions[0], dir=LOCAL_TMP_DIR)
+        os.close(fd)
 
-    try:
-        # تحميل الملف
-        await client.download_media(message, path)
-
-        # PDF
-        if path.lower().endswith(".pdf") or mime == "application/pdf":
-            links.update(_extract_from_pdf(path))
-
-        # DOCX
-        elif (
-            path.lower().endswith(".docx")
-            or mime == "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-        ):
-            links.update(_extract_from_docx(path))
-
-    finally:
-        # ✅ حذف الملف مباشرة بعد الاستخراج (أساسي)
         try:
-            if os.path.exists(path):
+            with metrics.timed("file_download_seconds", storage="disk"):
+                await client.download_media(message, path)
+
+            content_key = "sha256:" + await asyncio.to_thread(_hash_file, path)
+            links = await _parse_cached(extractor, path, doc_key, content_key, size)
+
+        finally:
+            # ✅ حذف الملف مباشرة بعد الاستخراج (أساسي)
+            try:
                 os.remove(path)
-        except Exception:
-            pass
+            except Exception:
+                pass
 
-    # Keep raw links as-is (normalize here only trims)
-    links = {_normalize_url(u) for u in links if u}
+    return links
 
-    return list(links)
+
+def _select_extractor(message: Message, count_skips: bool = False) -> Optional[FileExtractor]:
+    file = getattr(message, "file", None)
+    if not file:
+        return None
+
+    extractor = find_extractor(file.name, file.mime_type)
+    if extractor is None:
+        if count_skips:
+            metrics.inc("files_skipped_total", reason="type")
+        return None
+
+    # ✅ Skip large files (مهم جداً) - الحد خاص بكل نوع
+    size = getattr(file, "size", 0) or 0
+    if size > extractor.max_size_bytes:
+        if count_skips:
+            metrics.inc("files_skipped_total", reason="size")
+        return None
+
+    return extractor
 
 
 # ======================
-# Helpers
+# File Cache
 # ======================
 
-def _extract_urls_from_text(text: str) -> Set[str]:
-    found: Set[str] = set()
-    if not text:
-        return found
+def _media_cache_key(message: Message, size: int) -> Optional[str]:
+    """
+    معرف الوسائط في تيليجرام (document أو photo): مساحتا معرفات منفصلتان
+    """
+    doc_id = getattr(getattr(message, "document", None), "id", None)
+    if doc_id:
+        return f"doc:{doc_id}:{size}"
 
-    for u in URL_REGEX.findall(text):
-        found.add(u)
+    photo_id = getattr(getattr(message, "photo", None), "id", None)
+    if photo_id:
+        return f"photo:{photo_id}:{size}"
 
-    for u in BARE_URL_REGEX.findall(text):
-        found.add(u)
+    return None
 
-    for u in DOMAIN_URL_REGEX.findall(text):
-        if len(u) >= 6:
-            found.add(u)
 
-    return found
+def _hash_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+async def _parse_cached(
+    extractor: FileExtractor,
+    source: FileSource,
+    doc_key: Optional[str],
+    content_key: str,
+    size: int
+) -> List[str]:
+    """
+    نفس المحتوى بمعرف مختلف (إعادة رفع) → من الكاش بدون تحليل
+    غير ذلك: تحليل ثم حفظ النتيجة تحت المفتاحين
+    """
+    cached = get_cached_file_links(content_key)
+    if cached is not None:
+        metrics.inc("file_cache_hits_total", key="content")
+        if doc_key:
+            save_cached_file_links([doc_key], cached, size, FILE_CACHE_MAX_ENTRIES)
+        return cached
+
+    metrics.inc("file_cache_misses_total")
+
+    with metrics.timed("file_parse_seconds", parser=extractor.name):
+        parsed = await _parse_off_loop(extractor, source)
+    if parsed is None:
+        metrics.inc("file_parse_failures_total", parser=extractor.name)
+        return []  # فشل / مهلة: لا نحفظ في الكاش
+
+    # الشكل الموحد (canonical) لكل رابط
+    links = sorted({_normalize_url(u) for u in parsed if u})
+
+    save_cached_file_links([doc_key, content_key], links, size, FILE_CACHE_MAX_ENTRIES)
+    return links
+
+
+# ======================
+# Parse Pool
+# ======================
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ProcessPoolExecutor(
+            max_workers=PARSE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _parse_pool
+
+
+def shutdown_parse_pool():
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(wait=False, cancel_futures=True)
+        _parse_pool = None
+
+
+def _kill_parse_pool(pool: ProcessPoolExecutor):
+    """
+    إنهاء Processes الـ Pool بالقوة (تحليل عالق لا يتوقف بانتهاء المهلة وحدها)
+    الملفات القادمة تبدأ Pool جديد
+    """
+    global _parse_pool
+    if _parse_pool is pool:
+        _parse_pool = None
+
+    _killed_pools.add(pool)
+
+    # ProcessPoolExecutor لا يوفر terminate: نصل للـ Processes مباشرة
+    for proc in list((getattr(pool, "_processes", None) or {}).values()):
+        try:
+            proc.terminate()
+        except Exception:
+            pass
+
+    pool.shutdown(wait=False)
+
+
+def _open_source(source: FileSource):
+    return BytesIO(source) if isinstance(source, bytes) else source
+
+
+@contextmanager
+def _open_stream(source: FileSource) -> Iterator[BinaryIO]:
+    if isinstance(source, bytes):
+        yield BytesIO(source)
+    else:
+        with open(source, "rb") as f:
+            yield f
+
+
+async def _parse_off_loop(
+    extractor: FileExtractor,
+    source: FileSource
+) -> Optional[List[str]]:
+    """
+    تشغيل المحلل في Process منفصل
+    - حد أقصى لعدد التحليلات المتزامنة
+    - مهلة لكل ملف (حسب النوع): عند انتهائها يُقتل الـ Pool حتى لا يحجز الملف العالق مكانه
+    - None عند الفشل / انتهاء المهلة
+    """
+    global _parse_semaphore
+    if _parse_semaphore is None:
+        _parse_semaphore = asyncio.Semaphore(MAX_CONCURRENT_PARSES)
+
+    async with _parse_semaphore:
+        loop = asyncio.get_running_loop()
+
+        # محاولة ثانية فقط إذا قُتل الـ Pool بسبب ملف آخر
+        for attempt in range(2):
+            pool = _get_parse_pool()
+            try:
+                return await asyncio.wait_for(
+                    loop.run_in_executor(pool, extractor.parser, source),
+                    timeout=extractor.timeout_seconds,
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"File parse timed out ({extractor.name}), restarting parse pool")
+                _kill_parse_pool(pool)
+            except BrokenProcessPool:
+                if pool in _killed_pools and attempt == 0:
+                    continue
+                # Process مات (ذاكرة / crash): نبدأ Pool جديد للملفات القادمة
+                logger.error("Parse pool crashed, restarting")
+                _kill_parse_pool(pool)
+            except Exception as e:
+                logger.error(f"File parse error ({extractor.name}): {e}")
+            break
+
+    return None
 
 
 # ======================
 # PDF
 # ======================
 
-def _extract_from_pdf(path: str) -> List[str]:
+def _extract_from_pdf(
+    source: FileSource,
+    max_pages: Optional[int] = None,
+    time_budget: Optional[float] = None,
+    early_stop_pages: Optional[int] = None
+) -> List[str]:
+    """
+    1) روابط الـ annotations (رخيصة) لكل الصفحات ضمن الحد
+    2) نص الصفحات واحدة واحدة (الصفحة تُقرأ فقط عند الحاجة)
+    - توقف عند حد الصفحات / الوقت (ما جُمع قبلها يبقى)
+    - لا روابط تيليجرام / واتساب في أول early_stop_pages صفحات → لا داعي لقراءة الباقي
+    """
+    max_pages = PDF_MAX_PAGES if max_pages is None else max_pages
+    time_budget = PDF_TIME_BUDGET_SECONDS if time_budget is None else time_budget
+    early_stop_pages = PDF_EARLY_STOP_PAGES if early_stop_pages is None else early_stop_pages
+
     links: Set[str] = set()
+    deadline = time.monotonic() + time_budget
 
     try:
         from PyPDF2 import PdfReader
 
-        reader = PdfReader(path)
+        reader = PdfReader(_open_source(source), strict=False)
+        pages = reader.pages
+        count = min(len(pages), max_pages) if max_pages else len(pages)
+
+        # روابط أول صفحات المستند (لقرار التوقف المبكر)
+        head_found = False
+
+        # ========= Annotations =========
+        for i in range(count):
+            if time.monotonic() > deadline:
+                return list(links)
+
+            uris = _pdf_page_uris(pages[i])
+            links.update(uris)
+            if i < early_stop_pages and not head_found:
+                head_found = _any_collectable(uris)
+
+        # ========= Text =========
+        for i in range(count):
+            if time.monotonic() > deadline:
+                break
 
-        for page in reader.pages:
-            text = page.extract_text() or ""
-            links.update(_extract_urls_from_text(text))
+            if early_stop_pages and i >= early_stop_pages and not head_found:
+                break
 
-            # annotations hyperlinks
             try:
-                annots = page.get("/Annots", [])
-                if annots:
-                    for a in annots:
-                        obj = a.get_object()
-                        action = obj.get("/A", None)
-                        if action:
-                            uri = action.get("/URI", None)
-                            if uri:
-                                links.add(str(uri))
+                found = extract_urls_from_text(pages[i].extract_text() or "")
             except Exception:
-                pass
+                continue
+
+            links.update(found)
+            if i < early_stop_pages and not head_found:
+                head_found = _any_collectable(found)
+
+    except Exception:
+        pass
+
+    return list(links)
 
+
+def _any_collectable(links: Set[str]) -> bool:
+    return any(classify_link(u) for u in links)
+
+
+def _pdf_page_uris(page) -> Set[str]:
+    uris: Set[str] = set()
+
+    # annotations hyperlinks
+    try:
+        annots = page.get("/Annots")
+        if annots is None:
+            return uris
+        annots = annots.get_object()
+
+        for a in annots:
+            obj = a.get_object()
+            action = obj.get("/A", None)
+            if action:
+                uri = action.get_object().get("/URI", None)
+                if uri:
+                    uris.add(str(uri))
     except Exception:
         pass
 
+    return uris
+
+
+# ======================
+# Text (TXT / CSV)
+# ======================
+
+def _extract_from_text(source: FileSource) -> List[str]:
+    links: Set[str] = set()
+
+    with _open_stream(source) as raw:
+        _scan_text_stream(raw, links)
+
     return list(links)
 
 
+def _scan_text_stream(raw: BinaryIO, links: Set[str]):
+    """
+    قراءة على دفعات: الجزء الأخير من كل دفعة (بعد آخر مسافة)
+    يُضاف لبداية الدفعة التالية حتى لا ينقطع رابط بين دفعتين
+    """
+    reader = io.TextIOWrapper(raw, encoding="utf-8", errors="replace", newline="")
+    carry = ""
+
+    while True:
+        chunk = reader.read(TEXT_CHUNK_CHARS)
+        if not chunk:
+            break
+
+        text = carry + chunk
+        cut = _carry_cut(text)
+
+        links.update(extract_urls_from_text(text[:cut]))
+        carry = text[cut:]
+
+    links.update(extract_urls_from_text(carry))
+    reader.detach()
+
+
+def _carry_cut(text: str) -> int:
+    """
+    موضع القطع: بعد آخر مسافة (الذيل قد يكون بداية رابط) إلا إذا كان الذيل أطول من أي رابط
+    """
+    cut = max(text.rfind(" "), text.rfind("\n"), text.rfind("\t"))
+    if cut < 0 or len(text) - cut > MAX_LINK_CHARS:
+        cut = len(text)
+    return cut
+
+
 # ======================
-# DOCX
+# HTML
 # ======================
 
-def _extract_from_docx(path: str) -> List[str]:
+class _LinkHTMLParser(HTMLParser):
+    """
+    الروابط من href / src + الروابط الظاهرة في النص
+    النص يُجمع حتى الوسم التالي: handle_data يُستدعى عند نهاية كل دفعة من feed
+    فيقطع رابطًا بين دفعتين (نفس حد الحجم وذيل _scan_text_stream)
+    """
+
+    def __init__(self, links: Set[str]):
+        super().__init__(convert_charrefs=True)
+        self.links = links
+        self._text: List[str] = []
+        self._text_len = 0
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_text()
+        for name, value in attrs:
+            if name in ("href", "src", "data-href", "content") and value:
+                self.links.update(extract_urls_from_text(value))
+
+    def handle_endtag(self, tag):
+        self._flush_text()
+
+    def handle_data(self, data):
+        self._text.append(data)
+        self._text_len += len(data)
+        if self._text_len > TEXT_CHUNK_CHARS:
+            self._flush_text(keep_tail=True)
+
+    def close(self):
+        super().close()
+        self._flush_text()
+
+    def _flush_text(self, keep_tail: bool = False):
+        if not self._text:
+            return
+
+        text = "".join(self._text)
+        cut = _carry_cut(text) if keep_tail else len(text)
+
+        self.links.update(extract_urls_from_text(text[:cut]))
+        tail = text[cut:]
+        self._text = [tail] if tail else []
+        self._text_len = len(tail)
+
+
+def _extract_from_html(source: FileSource) -> List[str]:
     links: Set[str] = set()
+    parser = _LinkHTMLParser(links)
+
+    with _open_stream(source) as raw:
+        reader = io.TextIOWrapper(raw, encoding="utf-8", errors="replace")
+        for chunk in iter(lambda: reader.read(TEXT_CHUNK_CHARS), ""):
+            parser.feed(chunk)
+        parser.close()
+        reader.detach()
+
+    return list(links)
+
+
+# ======================
+# ZIP (bounded)
+# ======================
+
+class _ZipBudgetExceeded(Exception):
+    pass
+
+
+class _ZipBudget:
+    """
+    مجموع ما يُفك من الأرشيف الواحد (لا نثق بالأحجام المكتوبة في الـ headers)
+    """
+
+    def __init__(self, total_bytes: int = ZIP_MAX_TOTAL_BYTES):
+        self.remaining = total_bytes
+
+
+class _BoundedReader(io.RawIOBase):
+    def __init__(self, raw: BinaryIO, limit: int, budget: _ZipBudget):
+        self._raw = raw
+        self._limit = limit
+        self._budget = budget
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        data = self._raw.read(len(b))
+        n = len(data)
+
+        self._limit -= n
+        self._budget.remaining -= n
+        if self._limit < 0 or self._budget.remaining < 0:
+            raise _ZipBudgetExceeded("decompressed size limit")
+
+        b[:n] = data
+        return n
+
+
+def _member_allowed(info: zipfile.ZipInfo, max_bytes: int = ZIP_MAX_MEMBER_BYTES) -> bool:
+    if info.is_dir() or info.flag_bits & 0x1:  # مجلد / مشفر
+        return False
+    if info.file_size > max_bytes:
+        return False
+    return True
+
+
+def _ratio_allowed(info: zipfile.ZipInfo) -> bool:
+    """
+    للأرشيفات العامة فقط: XML داخل OOXML مكرر ونسبة ضغطه عالية طبيعيًا
+    (الحجم الفعلي بعد الفك محدود في _BoundedReader على أي حال)
+    """
+    return not info.compress_size or info.file_size / info.compress_size <= ZIP_MAX_RATIO
+
+
+@contextmanager
+def _open_member(
+    zf: zipfile.ZipFile,
+    info: zipfile.ZipInfo,
+    budget: _ZipBudget,
+    max_bytes: int = ZIP_MAX_MEMBER_BYTES
+) -> Iterator[BinaryIO]:
+    with zf.open(info) as raw:
+        yield io.BufferedReader(_BoundedReader(raw, max_bytes, budget))
+
+
+def _extract_from_zip(source: FileSource) -> List[str]:
+    """
+    كل ملف داخل الأرشيف يُحلل بمحلل نوعه (بدون أرشيف داخل أرشيف)
+    """
+    links: Set[str] = set()
+    budget = _ZipBudget()
 
     try:
-        from docx import Document
+        with zipfile.ZipFile(_open_source(source)) as zf:
+            for info in zf.infolist()[:ZIP_MAX_MEMBERS]:
+                # اسم الملف نفسه قد يكون رابط
+                links.update(extract_urls_from_text(info.filename))
+
+                extractor = find_extractor(info.filename, None)
+                if extractor is None or extractor.name == "zip":
+                    continue
+                if not _member_allowed(info, min(ZIP_MAX_MEMBER_BYTES, extractor.max_size_bytes)):
+                    continue
+                if not _ratio_allowed(info):
+                    continue
+
+                try:
+                    with _open_member(zf, info, budget) as f:
+                        data = f.read()
+                    links.update(extractor.parser(data))
+                except _ZipBudgetExceeded:
+                    break
+                except Exception:
+                    continue
 
-        doc = Document(path)
+    except Exception:
+        pass
 
-        for para in doc.paragraphs:
-            links.update(_extract_urls_from_text(para.text))
+    return list(links)
 
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    links.update(_extract_urls_from_text(cell.text))
 
-        # Hyperlinks relationships
-        try:
-            rels = doc.part.rels
-            for rel in rels.values():
-                if rel.reltype and "hyperlink" in rel.reltype:
-                    target = getattr(rel, "target_ref", None)
+# ======================
+# OOXML (DOCX / XLSX / PPTX)
+# ======================
+
+# قراءة الأجزاء مباشرة من الـ zip كـ XML stream (بدون بناء نموذج المستند كاملاً)
+
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_SHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_DRAWING_NS = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+
+
+def _iter_ooxml_blocks(
+    f: BinaryIO,
+    text_tags: Tuple[str, ...],
+    block_tags: Tuple[str, ...],
+    break_tags: Tuple[str, ...] = ()
+) -> Iterator[str]:
+    """
+    قراءة XML كـ stream (iterparse) وتجميع النص لكل فقرة / خلية
+    (الرابط قد يكون مقسومًا على أكثر من run داخل نفس الفقرة)
+    break_tags (سطر جديد / tab) → مسافة بين النصوص، وإلا التصق السطر التالي بالرابط
+    كل عنصر يُحذف من الشجرة عند نهايته (نصه في parts مسبقًا)، وليس الفقرات فقط:
+    الصفوف / الخلايا / الخصائص لا تتراكم → ذاكرة ثابتة مهما كبر الملف
+    """
+    parts: List[str] = []
+    stack: List[ET.Element] = []
+
+    for event, elem in ET.iterparse(f, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            continue
+
+        stack.pop()
+        tag = elem.tag
+        if tag in text_tags:
+            if elem.text:
+                parts.append(elem.text)
+        elif tag in break_tags:
+            parts.append("\n")
+        elif tag in block_tags and parts:
+            yield "".join(parts)
+            parts = []
+
+        # الأب ما زال يُقرأ: أبناؤه السابقون حُذفوا → remove بدون بحث طويل
+        elem.clear()
+        if stack:
+            stack[-1].remove(elem)
+
+    if parts:
+        yield "".join(parts)
+
+
+def _iter_rels_hyperlinks(zf: zipfile.ZipFile, budget: _ZipBudget) -> Iterator[str]:
+    for info in zf.infolist():
+        if not info.filename.endswith(".rels") or not _member_allowed(info):
+            continue
+
+        with _open_member(zf, info, budget) as f:
+            for _, elem in ET.iterparse(f, events=("end",)):
+                if elem.tag == _REL_NS + "Relationship" and elem.get("Type", "").endswith("/hyperlink"):
+                    target = elem.get("Target")
                     if target:
-                        links.add(str(target))
-        except Exception:
-            pass
+                        yield target
+                elem.clear()
+
+
+def _extract_from_ooxml(
+    source: FileSource,
+    is_part: Callable[[str], bool],
+    text_tags: Tuple[str, ...],
+    block_tags: Tuple[str, ...],
+    break_tags: Tuple[str, ...] = ()
+) -> List[str]:
+    links: Set[str] = set()
+    budget = _ZipBudget()
+
+    try:
+        with zipfile.ZipFile(_open_source(source)) as zf:
+            for info in zf.infolist():
+                if not is_part(info.filename) or not _member_allowed(info):
+                    continue
+                try:
+                    with _open_member(zf, info, budget) as f:
+                        for text in _iter_ooxml_blocks(f, text_tags, block_tags, break_tags):
+                            links.update(extract_urls_from_text(text))
+                except ET.ParseError:
+                    continue
+
+            links.update(_iter_rels_hyperlinks(zf, budget))
+
+    except _ZipBudgetExceeded:
+        # ما تم جمعه قبل تجاوز الحد يبقى
+        logger.warning(f"OOXML decompressed size limit reached, {len(links)} links kept")
+    except Exception:
+        pass  # ما تم جمعه قبل الخطأ يبقى
+
+    return list(links)
+
+
+def _is_docx_text_part(name: str) -> bool:
+    if not (name.startswith("word/") and name.endswith(".xml")):
+        return False
+    base = name[len("word/"):]
+    return base in ("document.xml", "footnotes.xml", "endnotes.xml") or (
+        "/" not in base and base.startswith(("header", "footer"))
+    )
+
+
+def _is_xlsx_text_part(name: str) -> bool:
+    return name == "xl/sharedStrings.xml" or (
+        name.startswith("xl/worksheets/") and name.endswith(".xml")
+    ) or (name.startswith("xl/comments") and name.endswith(".xml"))
+
+
+def _is_pptx_text_part(name: str) -> bool:
+    return name.endswith(".xml") and (
+        name.startswith("ppt/slides/slide") or name.startswith("ppt/notesSlides/")
+    )
+
+
+def _extract_from_docx(source: FileSource) -> List[str]:
+    # t: نص الـ runs، instrText: حقول HYPERLINK "..." - الجداول فقرات عادية (كل خلية مرة واحدة)
+    # br / cr / tab: فواصل داخل الفقرة (python-docx يضع \n و \t مكانها)
+    # روابط w:hyperlink تأتي من _rels (Target) بدون ربط r:id
+    return _extract_from_ooxml(
+        source,
+        _is_docx_text_part,
+        (_WORD_NS + "t", _WORD_NS + "instrText"),
+        (_WORD_NS + "p",),
+        (_WORD_NS + "br", _WORD_NS + "cr", _WORD_NS + "tab"),
+    )
+
+
+def _extract_from_xlsx(source: FileSource) -> List[str]:
+    # t: نص (مشترك / inline)، f: معادلة (HYPERLINK)، v: القيمة المحسوبة
+    return _extract_from_ooxml(
+        source,
+        _is_xlsx_text_part,
+        (_SHEET_NS + "t", _SHEET_NS + "f", _SHEET_NS + "v"),
+        (_SHEET_NS + "si", _SHEET_NS + "c"),
+    )
+
+
+def _extract_from_pptx(source: FileSource) -> List[str]:
+    return _extract_from_ooxml(
+        source,
+        _is_pptx_text_part,
+        (_DRAWING_NS + "t",),
+        (_DRAWING_NS + "p",),
+        (_DRAWING_NS + "br",),
+    )
+
+
+# ======================
+# Images (QR) - optional
+# ======================
+
+def _qr_available() -> bool:
+    return bool(
+        QR_ENABLED
+        and importlib.util.find_spec("pyzbar")
+        and importlib.util.find_spec("PIL")
+    )
+
+
+def _extract_from_image_qr(source: FileSource) -> List[str]:
+    links: Set[str] = set()
+
+    try:
+        from PIL import Image
+        from pyzbar.pyzbar import decode
+
+        # حماية من الصور الضخمة (decompression bomb)
+        Image.MAX_IMAGE_PIXELS = QR_MAX_PIXELS
+
+        with Image.open(_open_source(source)) as img:
+            img.draft("L", (QR_MAX_SIDE, QR_MAX_SIDE))  # JPEG: تصغير أثناء الفك
+            gray = img.convert("L")
+            gray.thumbnail((QR_MAX_SIDE, QR_MAX_SIDE))
+
+            for symbol in decode(gray):
+                data = symbol.data.decode("utf-8", errors="replace")
+                links.update(extract_urls_from_text(data))
 
     except Exception:
         pass
 
     return list(links)
+
+
+# ======================
+# Registration
+# ======================
+
+register_extractor(FileExtractor(
+    name="pdf",
+    parser=_extract_from_pdf,
+    extensions=(".pdf",),
+    mime_types=(PDF_MIME,),
+))
+
+register_extractor(FileExtractor(
+    name="docx",
+    parser=_extract_from_docx,
+    extensions=(".docx",),
+    mime_types=(DOCX_MIME,),
+))
+
+register_extractor(FileExtractor(
+    name="text",
+    parser=_extract_from_text,
+    extensions=(".txt", ".csv", ".tsv", ".md", ".log", ".json"),
+    mime_types=("text/plain", "text/csv", "text/tab-separated-values", "text/markdown", "application/json"),
+    timeout_seconds=30,
+))
+
+register_extractor(FileExtractor(
+    name="html",
+    parser=_extract_from_html,
+    extensions=(".html", ".htm", ".xhtml"),
+    mime_types=("text/html", "application/xhtml+xml"),
+    timeout_seconds=30,
+))
+
+register_extractor(FileExtractor(
+    name="xlsx",
+    parser=_extract_from_xlsx,
+    extensions=(".xlsx", ".xlsm"),
+    mime_types=(XLSX_MIME, "application/vnd.ms-excel.sheet.macroenabled.12"),
+))
+
+register_extractor(FileExtractor(
+    name="pptx",
+    parser=_extract_from_pptx,
+    extensions=(".pptx",),
+    mime_types=(PPTX_MIME,),
+))
+
+register_extractor(FileExtractor(
+    name="zip",
+    parser=_extract_from_zip,
+    extensions=(".zip",),
+    mime_types=("application/zip", "application/x-zip-compressed"),
+))
+
+if _qr_available():
+    register_extractor(FileExtractor(
+        name="image_qr",
+        parser=_extract_from_image_qr,
+        extensions=(".png", ".jpg", ".jpeg", ".webp", ".bmp"),
+        mime_types=("image/png", "image/jpeg", "image/webp", "image/bmp"),
+        max_size_bytes=QR_MAX_FILE_SIZE_BYTES,
+        timeout_seconds=20,
+    ))
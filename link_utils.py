@@ -1,5 +1,6 @@
 import re
-from typing import List, Set
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 from telethon.tl.types import Message
 from telethon.tl.types import (
     MessageEntityTextUrl,
@@ -7,54 +8,161 @@ from telethon.tl.types import (
 )
 
 # ======================
-# Regex عام لأي رابط
+# Scanner واحد لأي رابط
 # ======================
 
-URL_REGEX = re.compile(
-    r"(https?://[^\s<>\"]+)",
+# تمريرة واحدة من اليسار لليمين بدل ثلاث تمريرات (https / www / دومين)
+# الترتيب مهم: الرابط الكامل يُلتقط أولاً فلا تظهر أجزاء متداخلة منه
+LINK_SCAN_REGEX = re.compile(
+    r"https?://[^\s<>\"]+"
+    r"|www\.[^\s<>\"]+"
+    r"|(?:[a-z0-9-]+\.)+[a-z]{2,}(?:/[^\s<>\"]*)?",
     re.IGNORECASE
 )
 
-BARE_URL_REGEX = re.compile(
-    r"((?:www\.)[^\s<>\"]+)",
-    re.IGNORECASE
-)
+# نص لا يحتوي أيًا من هذه لا يمكن أن يحتوي رابط تيليجرام / واتساب
+LINK_HINTS = ("t.me", "telegram.me", "telegram.dog", "whatsapp", "wa.me")
+
+# أقصر دومين بدون scheme نقبله
+MIN_DOMAIN_LINK_LEN = 6
 
-DOMAIN_URL_REGEX = re.compile(
-    r"((?:[a-z0-9-]+\.)+[a-z]{2,}(?:/[^\s<>\"]*)?)",
-    re.IGNORECASE
-)
 
 # ======================
-# URL Normalize
+# URL Normalize (Canonical)
 # ======================
 
+# كل الأشكال تتحول لشكل واحد: https://t.me/...
+TELEGRAM_HOSTS = {"t.me", "telegram.me", "telegram.dog"}
+
+WHATSAPP_INVITE_HOST = "chat.whatsapp.com"
+
+# معاملات تتبع لا تغير الوجهة
+TRACKING_PARAMS = {
+    "ref", "ref_src", "fbclid", "gclid", "igshid", "si", "mc_cid", "mc_eid",
+}
+
+# علامات ترقيم تلتصق بنهاية الرابط داخل النص
+TRAILING_PUNCTUATION = ".,;:!?)]}>'\"»«،؛؟…*"
+
+
+def canonicalize_link(url: str) -> str:
+    """
+    الشكل الموحد للرابط (يُستخدم في التصنيف ومنع التكرار والإرسال)
+
+    - https دائمًا + host بحروف صغيرة بدون www.
+    - telegram.me / telegram.dog → t.me
+    - t.me/joinchat/X → t.me/+X
+    - اسم المستخدم بحروف صغيرة (كود الدعوة يبقى كما هو: حساس لحالة الأحرف)
+    - حذف معاملات التتبع والـ fragment وعلامات الترقيم في النهاية
+    - chat.whatsapp.com/invite/X → chat.whatsapp.com/X
+    """
+    if not url:
+        return url
+
+    u = url.strip().rstrip(TRAILING_PUNCTUATION)
+    if not u:
+        return u
+
+    if "://" not in u[:12]:
+        u = "https://" + u
+
+    try:
+        parts = urlsplit(u)
+        host = (parts.hostname or "").lower()
+    except ValueError:
+        return u
+
+    if not host:
+        return u
+
+    if host.startswith("www."):
+        host = host[4:]
+
+    segs = [p for p in parts.path.split("/") if p]
+    query = _strip_tracking_params(parts.query)
+
+    # ===== Telegram =====
+    if host in TELEGRAM_HOSTS:
+        host = "t.me"
+
+        if segs and segs[0].startswith("%2B"):
+            segs[0] = "+" + segs[0][3:]
+
+        if segs and segs[0].lower() == "joinchat":
+            segs = (["+" + segs[1]] + segs[2:]) if len(segs) > 1 else []
+
+        elif segs and not segs[0].startswith("+"):
+            segs[0] = segs[0].lower()
+
+    # ===== WhatsApp =====
+    elif host == WHATSAPP_INVITE_HOST:
+        if segs and segs[0].lower() == "invite":
+            segs = segs[1:]
+        segs = segs[:1]
+        query = ""
+
+    path = ("/" + "/".join(segs)) if segs else ""
+
+    return urlunsplit(("https", host, path, query, ""))
+
+
+def _strip_tracking_params(query: str) -> str:
+    if not query:
+        return query
+
+    params = parse_qsl(query, keep_blank_values=True)
+    kept = [
+        (k, v)
+        for k, v in params
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith("utm_")
+    ]
+
+    # لا شيء للحذف: نُبقي النص الأصلي كما هو
+    if len(kept) == len(params):
+        return query
+    return urlencode(kept)
+
+
 def _normalize_url(u: str) -> str:
-    return u.strip() if u else u
+    return canonicalize_link(u)
 
 
 # ======================
 # استخراج الروابط من الرسالة
 # ======================
 
-def extract_links_from_message(message: Message) -> List[str]:
-    links: Set[str] = set()
-    text = message.text or message.message or ""
+def extract_urls_from_text(text: str) -> Set[str]:
+    """
+    استخراج الروابط من نص بتمريرة واحدة
+    (بدون أي regex إذا لم يحتوي النص على تلميح تيليجرام / واتساب)
+    """
+    found: Set[str] = set()
+    if not text or not _has_link_hint(text):
+        return found
+
+    for m in LINK_SCAN_REGEX.finditer(text):
+        u = m.group()
+        if len(u) >= MIN_DOMAIN_LINK_LEN or u[:4].lower() in ("http", "www."):
+            found.add(_normalize_url(u))
 
-    # 1) روابط https
-    for u in URL_REGEX.findall(text):
-        links.add(_normalize_url(u))
+    return found
 
-    # 2) روابط www.
-    for u in BARE_URL_REGEX.findall(text):
-        links.add(_normalize_url(u))
 
-    # 3) دومين بدون scheme
-    for u in DOMAIN_URL_REGEX.findall(text):
-        if len(u) >= 6:
-            links.add(_normalize_url(u))
+def _has_link_hint(text: str) -> bool:
+    low = text.lower()
+    for hint in LINK_HINTS:
+        if hint in low:
+            return True
+    return False
 
-    # 4) entities
+
+def extract_links_from_message(message: Message) -> List[str]:
+    text = message.text or message.message or ""
+
+    # 1) روابط النص (https / www. / دومين بدون scheme)
+    links: Set[str] = extract_urls_from_text(text)
+
+    # 2) entities
     if getattr(message, "entities", None) and text:
         for ent in message.entities:
             if isinstance(ent, MessageEntityTextUrl) and ent.url:
@@ -67,7 +175,7 @@ def extract_links_from_message(message: Message) -> List[str]:
                 except Exception:
                     pass
 
-    # 5) Inline buttons (آمن)
+    # 3) Inline buttons (آمن)
     try:
         rm = getattr(message, "reply_markup", None)
         if rm and getattr(rm, "rows", None):
@@ -85,47 +193,153 @@ def extract_links_from_message(message: Message) -> List[str]:
 # Telegram / WhatsApp classification
 # =========================================================
 
+# التوجيه حسب host بالضبط (وليس "t.me" في أي مكان من الرابط) وأول جزء من المسار
+# + إرجاع مفتاح الدعوة / القناة (منع التكرار والإرسال بالرابط المبني منه)
+# ليس أسرع من سلسلة الـ regex القديمة: الهدف الدقة وليس السرعة
+
+# (platform, chat_type, key) - key = مفتاح الدعوة / القناة بالشكل الموحد
+Classification = Tuple[str, str, str]
+
 # -------- Telegram --------
 
-TG_GROUP_REGEX = re.compile(r"https?://t\.me/(joinchat/|\+)[A-Za-z0-9_-]+", re.I)
-TG_CHANNEL_REGEX = re.compile(r"https?://t\.me/[A-Za-z0-9_]+$", re.I)
-TG_MESSAGE_REGEX = re.compile(r"https?://t\.me/(?:c/\d+|[A-Za-z0-9_]+)/\d+", re.I)
-TG_ADDLIST_REGEX = re.compile(r"https?://t\.me/addlist/[A-Za-z0-9_-]+", re.I)
+TG_USERNAME_REGEX = re.compile(r"[A-Za-z0-9_]+")
+TG_INVITE_REGEX = re.compile(r"[A-Za-z0-9_-]+")
 
 # -------- WhatsApp --------
 
-WA_GROUP_REGEX = re.compile(r"https?://chat\.whatsapp\.com/[A-Za-z0-9]+", re.I)
+WA_CODE_REGEX = re.compile(r"[A-Za-z0-9]+")
 
 
-def filter_and_classify_link(url: str):
+def classify_link(url: str) -> Optional[Classification]:
     """
     Returns:
-        (platform, chat_type)
+        (platform, chat_type, key) أو None
         platform ∈ {telegram, whatsapp}
+        chat_type ∈ {group, channel, message, addlist} لتيليجرام / group لواتساب
     """
-    url = _normalize_url(url)
+    if not url or not _has_link_hint(url):
+        return None
+    return classify_canonical_link(canonicalize_link(url))
 
-    # ===== Telegram =====
-    if "t.me" in url:
 
-        if TG_ADDLIST_REGEX.match(url):
-            return ("telegram", "addlist")
+def classify_links(urls: Iterable[str], canonical: bool = False) -> Dict[str, Classification]:
+    """
+    تصنيف كل روابط الرسالة مرة واحدة
+    canonical=True → الروابط موحدة مسبقًا (مثل ناتج extract_links_from_message)
+
+    Returns:
+        الرابط الموحد → (platform, chat_type, key) للروابط المقبولة فقط
+    """
+    result: Dict[str, Classification] = {}
+
+    for url in urls:
+        if not url:
+            continue
+        link = url if canonical else canonicalize_link(url)
+        if link in result:
+            continue
 
-        if TG_MESSAGE_REGEX.match(url):
-            return ("telegram", "message")
+        classified = classify_canonical_link(link)
+        if classified:
+            result[link] = classified
 
-        if TG_GROUP_REGEX.match(url):
-            return ("telegram", "group")
+    return result
 
-        if TG_CHANNEL_REGEX.match(url):
-            return ("telegram", "channel")
 
+def classify_canonical_link(link: str) -> Optional[Classification]:
+    scheme_end = link.find("://")
+    if scheme_end < 0:
         return None
 
-    # ===== WhatsApp =====
-    if "whatsapp.com" in url or "wa.me" in url:
-        if WA_GROUP_REGEX.match(url):
-            return ("whatsapp", "group")
+    host, _, path = link[scheme_end + 3:].partition("/")
+    path, _, query = path.partition("?")
+    host = host.lower()
+
+    if host == "t.me":
+        return _classify_telegram(path.split("/") if path else [], query)
+
+    if host == WHATSAPP_INVITE_HOST:
+        return _classify_whatsapp(path.split("/", 1)[0])
+
+    return None
+
+
+def _classify_telegram(segs: List[str], query: str) -> Optional[Classification]:
+    if not segs:
         return None
 
+    first = segs[0]
+
+    # t.me/addlist/<slug>
+    if first == "addlist" and len(segs) > 1:
+        m = TG_INVITE_REGEX.match(segs[1])
+        if m:
+            return ("telegram", "addlist", m.group())
+
+    # t.me/<username>/<id> أو t.me/c/<chat>/<id>
+    if len(segs) > 1 and segs[1][:1].isdecimal() and TG_USERNAME_REGEX.fullmatch(first):
+        key = "/".join(segs[:3] if first == "c" else segs[:2])
+        return ("telegram", "message", key)
+
+    # t.me/+<invite> (joinchat تحول إلى + في الشكل الموحد)
+    if first.startswith("+"):
+        m = TG_INVITE_REGEX.match(first, 1)
+        if m:
+            return ("telegram", "group", m.group())
+        return None
+
+    # t.me/<username> فقط (بدون مسار أو query إضافي)
+    if len(segs) == 1 and not query and TG_USERNAME_REGEX.fullmatch(first):
+        return ("telegram", "channel", first)
+
+    return None
+
+
+def _classify_whatsapp(code: str) -> Optional[Classification]:
+    m = WA_CODE_REGEX.match(code)
+    if m:
+        return ("whatsapp", "group", m.group())
     return None
+
+
+def link_from_key(platform: str, chat_type: str, key: str) -> str:
+    """
+    الرابط من مفتاح التصنيف: الشكل الذي يُرسل ويُخزن لمنع التكرار
+    (t.me/+X و t.me/+X?foo و t.me/joinchat/X → نفس الرابط)
+    """
+    if platform == "whatsapp":
+        return f"https://{WHATSAPP_INVITE_HOST}/{key}"
+
+    if chat_type == "group":
+        return f"https://t.me/+{key}"
+
+    if chat_type == "addlist":
+        return f"https://t.me/addlist/{key}"
+
+    # channel / message
+    return f"https://t.me/{key}"
+
+
+def classified_links(urls: Iterable[str], canonical: bool = False) -> Dict[str, Tuple[str, str]]:
+    """
+    نفس classify_links لكن بالرابط المبني من المفتاح
+
+    Returns:
+        الرابط → (platform, chat_type)
+    """
+    return {
+        link_from_key(platform, chat_type, key): (platform, chat_type)
+        for platform, chat_type, key in classify_links(urls, canonical).values()
+    }
+
+
+def filter_and_classify_link(url: str):
+    """
+    Returns:
+        (platform, chat_type)
+        platform ∈ {telegram, whatsapp}
+    """
+    classified = classify_link(url)
+    if not classified:
+        return None
+    return classified[:2]
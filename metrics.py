@@ -0,0 +1,334 @@
+"""
+عدادات ومدرجات زمنية (histograms) لمراحل الجمع
+
+- العدادات: inc("links_extracted_total", source="text")
+- الزمن: with timed("file_parse_seconds", parser="pdf"): ...
+- القيم اللحظية: set_gauge("pipeline_queue_depth", 12, stage="links")
+- أكثر القيم لـ label غير محدود: inc_top("dialog_messages_scanned", "dialog", chat_id)
+- العرض: /stats في البوت أو نص بصيغة Prometheus
+"""
+import bisect
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# ======================
+# Settings
+# ======================
+
+# حدود الـ buckets بالثواني (من 1ms حتى دقيقة)
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+# inc_top: عدد المفاتيح المتتبعة (Space-Saving) والمعروضة لكل مقياس
+TOP_KEYS_TRACKED = 200
+TOP_KEYS_EXPORTED = 20
+
+# ======================
+# Global State
+# ======================
+
+# المفتاح: (اسم المقياس، labels مرتبة)
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+_counters: Dict[LabelKey, float] = {}
+_gauges: Dict[LabelKey, float] = {}
+
+# histogram → [counts لكل bucket + inf, sum, count]
+_histograms: Dict[LabelKey, list] = {}
+
+# top → (اسم الـ label، المفتاح → العدد التقريبي)
+_tops: Dict[LabelKey, Tuple[str, Dict[str, float]]] = {}
+
+_started_at = time.time()
+
+
+# ======================
+# Recording
+# ======================
+
+def inc(name: str, value: float = 1, **labels):
+    key = _key(name, labels)
+    _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels):
+    _gauges[_key(name, labels)] = value
+
+
+def inc_top(name: str, label: str, key, value: float = 1, **labels):
+    """
+    عداد لأكثر المفاتيح فقط (label عدد قيمه غير محدود مثل chat_id)
+    Space-Saving: ذاكرة ثابتة TOP_KEYS_TRACKED، والمفتاح الجديد يأخذ مكان الأصغر
+    (العدد تقريبي للأعلى، والمفاتيح الكبيرة تبقى)
+    """
+    top_key = _key(name, labels)
+    top = _tops.get(top_key)
+    if top is None:
+        top = _tops[top_key] = (label, {})
+
+    counts = top[1]
+    key = str(key)
+
+    if key in counts:
+        counts[key] += value
+    elif len(counts) < TOP_KEYS_TRACKED:
+        counts[key] = value
+    else:
+        smallest = min(counts, key=counts.get)
+        counts[key] = counts.pop(smallest) + value
+
+
+def observe(name: str, seconds: float, **labels):
+    key = _key(name, labels)
+    hist = _histograms.get(key)
+    if hist is None:
+        hist = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0, 0]
+        _histograms[key] = hist
+
+    hist[0][bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+    hist[1] += seconds
+    hist[2] += 1
+
+
+@contextmanager
+def timed(name: str, **labels):
+    """
+    قياس زمن كتلة كود (يعمل أيضًا حول await)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+# ======================
+# Snapshots
+# ======================
+
+def snapshot() -> dict:
+    """
+    نسخة قابلة للتحويل إلى JSON (لتجميع عمال الجمع في Process واحد)
+    """
+    return {
+        "started_at": _started_at,
+        "counters": [[name, dict(labels), value] for (name, labels), value in _counters.items()],
+        "gauges": [[name, dict(labels), value] for (name, labels), value in _gauges.items()],
+        "histograms": [
+            [name, dict(labels), list(h[0]), h[1], h[2]]
+            for (name, labels), h in _histograms.items()
+        ],
+        "top": [
+            [name, dict(labels), label, _top_items(counts)]
+            for (name, labels), (label, counts) in _tops.items()
+        ],
+    }
+
+
+def merge_snapshots(snapshots: Iterable[dict]) -> dict:
+    counters: Dict[LabelKey, float] = {}
+    gauges: Dict[LabelKey, float] = {}
+    histograms: Dict[LabelKey, list] = {}
+    tops: Dict[LabelKey, Tuple[str, Dict[str, float]]] = {}
+    started_at: Optional[float] = None
+
+    for snap in snapshots:
+        if not snap:
+            continue
+
+        started = snap.get("started_at")
+        if started is not None:
+            started_at = started if started_at is None else min(started_at, started)
+
+        for name, labels, value in snap.get("counters", []):
+            key = _key(name, labels)
+            counters[key] = counters.get(key, 0) + value
+
+        # القيم اللحظية لكل عامل لها labels خاصة غالبًا، وعند التصادم الأكبر
+        for name, labels, value in snap.get("gauges", []):
+            key = _key(name, labels)
+            gauges[key] = max(gauges.get(key, value), value)
+
+        for name, labels, buckets, total, count in snap.get("histograms", []):
+            key = _key(name, labels)
+            hist = histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+            hist[0] = [a + b for a, b in zip(hist[0], buckets)]
+            hist[1] += total
+            hist[2] += count
+
+        for name, labels, label, items in snap.get("top", []):
+            counts = tops.setdefault(_key(name, labels), (label, {}))[1]
+            for key, value in items:
+                counts[key] = counts.get(key, 0) + value
+
+    return {
+        "started_at": started_at if started_at is not None else time.time(),
+        "counters": [[n, dict(l), v] for (n, l), v in counters.items()],
+        "gauges": [[n, dict(l), v] for (n, l), v in gauges.items()],
+        "histograms": [[n, dict(l), list(h[0]), h[1], h[2]] for (n, l), h in histograms.items()],
+        "top": [[n, dict(l), label, _top_items(c)] for (n, l), (label, c) in tops.items()],
+    }
+
+
+# ======================
+# Rendering
+# ======================
+
+def render_prometheus(snap: Optional[dict] = None) -> str:
+    """
+    صيغة Prometheus النصية (تصلح لـ node_exporter textfile collector)
+    """
+    snap = snap or snapshot()
+    lines: List[str] = []
+    typed: set = set()
+
+    for name, labels, value in sorted(snap["counters"], key=_sort_key):
+        metric = f"collector_{name}"
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} counter")
+            typed.add(metric)
+        lines.append(f"{metric}{_labels_text(labels)} {_number(value)}")
+
+    for name, labels, value in sorted(snap.get("gauges", []), key=_sort_key):
+        metric = f"collector_{name}"
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} gauge")
+            typed.add(metric)
+        lines.append(f"{metric}{_labels_text(labels)} {_number(value)}")
+
+    for name, labels, label, items in sorted(snap.get("top", []), key=_sort_key):
+        metric = f"collector_{name}"
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} gauge")
+            typed.add(metric)
+        for key, value in items:
+            lines.append(f"{metric}{_labels_text({**labels, label: key})} {_number(value)}")
+
+    for name, labels, buckets, total, count in sorted(snap["histograms"], key=_sort_key):
+        metric = f"collector_{name}"
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} histogram")
+            typed.add(metric)
+
+        cumulative = 0
+        for bound, n in zip(LATENCY_BUCKETS + (None,), buckets):
+            cumulative += n
+            le = "+Inf" if bound is None else _number(bound)
+            lines.append(f"{metric}_bucket{_labels_text({**labels, 'le': le})} {cumulative}")
+        lines.append(f"{metric}_sum{_labels_text(labels)} {_number(total)}")
+        lines.append(f"{metric}_count{_labels_text(labels)} {count}")
+
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str, snap: Optional[dict] = None):
+    """
+    كتابة ذرية (ملف مؤقت ثم rename) حتى لا يُقرأ ملف نصف مكتوب
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(render_prometheus(snap))
+        os.replace(tmp, path)
+    except Exception:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def counter_total(snap: dict, name: str, **labels) -> float:
+    """
+    مجموع العداد لكل القيم التي تطابق labels المعطاة
+    """
+    return sum(
+        value for n, l, value in snap["counters"]
+        if n == name and all(l.get(k) == str(v) for k, v in labels.items())
+    )
+
+
+def counter_by(snap: dict, name: str, label: str) -> Dict[str, float]:
+    result: Dict[str, float] = {}
+    for n, l, value in snap["counters"]:
+        if n == name and label in l:
+            result[l[label]] = result.get(l[label], 0) + value
+    return result
+
+
+def histogram_summary(snap: dict, name: str) -> Optional[dict]:
+    """
+    count / avg / p50 / p99 (تقديرية من الـ buckets) لكل labels مجتمعة
+    """
+    buckets: Optional[List[int]] = None
+    total = 0.0
+    count = 0
+
+    for n, _, b, s, c in snap["histograms"]:
+        if n != name:
+            continue
+        buckets = b if buckets is None else [x + y for x, y in zip(buckets, b)]
+        total += s
+        count += c
+
+    if not count:
+        return None
+
+    return {
+        "count": count,
+        "avg": total / count,
+        "p50": _quantile(buckets, count, 0.5),
+        "p99": _quantile(buckets, count, 0.99),
+    }
+
+
+# ======================
+# Helpers
+# ======================
+
+def _key(name: str, labels: dict) -> LabelKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _top_items(counts: Dict[str, float]) -> List[list]:
+    items = sorted(counts.items(), key=lambda kv: kv[1], reverse=True)
+    return [[k, v] for k, v in items[:TOP_KEYS_EXPORTED]]
+
+
+def _sort_key(item):
+    return item[0], sorted(item[1].items())
+
+
+def _labels_text(labels: dict) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for k, v in sorted(labels.items()):
+        v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _quantile(buckets: List[int], count: int, q: float) -> float:
+    """
+    الحد الأعلى للـ bucket الذي يصل إليه الترتيب المطلوب
+    """
+    rank = q * count
+    cumulative = 0
+    for bound, n in zip(LATENCY_BUCKETS, buckets):
+        cumulative += n
+        if cumulative >= rank:
+            return bound
+    return float("inf")
@@ -0,0 +1,333 @@
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from telethon import TelegramClient
+from telethon.errors import FloodWaitError
+
+import metrics
+from config import CLIENT_MAX_FLOOD_WAIT_SECONDS, SEND_MIN_INTERVAL_SECONDS
+from database import claim_links, release_links
+
+# ======================
+# Logging
+# ======================
+
+logger = logging.getLogger(__name__)
+
+# ======================
+# Settings
+# ======================
+
+# حد طول رسالة تيليجرام
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# انتظار قصير لتجميع الروابط في رسالة واحدة
+SEND_BATCH_WAIT_SECONDS = 1.0
+
+# أقصى وقت لتفريغ الطابور عند إيقاف الجمع
+SEND_DRAIN_TIMEOUT_SECONDS = 60
+
+# سعة طابور كل قناة هدف: الممتلئ يبطئ مرحلة التصنيف (backpressure)
+# بدل تراكم روابط لا تُرسل قبل انتهاء مهلة التفريغ
+SEND_QUEUE_SIZE = 500
+
+# عنصر الطابور: (platform, link, on_sent)
+# on_sent يُستدعى بعد الإرسال (أو إذا كان الرابط محجوزًا/مرسلاً مسبقًا)
+# وليس عند الفشل → نقطة الاستئناف لا تتخطى الرسالة
+SendItem = Tuple[str, str, Optional[Callable[[], None]]]
+
+# ======================
+# Global State
+# ======================
+
+# طابور إرسال لكل (مشرف، قناة هدف)
+_senders: Dict[Tuple[int, str], "_TargetSender"] = {}
+
+# روابط في الطابور ولم تُرسل بعد → (admin_id, platform, link)
+_pending: Set[Tuple[int, str, str]] = set()
+
+# FloodWait إرسال أطول من الحد → المشرف محظور حتى drain_senders
+# (الروابط لا تُرسل، ومشرف الحسابات يتعامل مع الخطأ)
+_send_floods: Dict[int, FloodWaitError] = {}
+_send_flood_events: Dict[int, asyncio.Event] = {}
+
+
+# ======================
+# Public API
+# ======================
+
+def is_link_pending(admin_id: int, platform: str, link: str) -> bool:
+    return (admin_id, platform, link) in _pending
+
+
+async def enqueue_link(
+    client: TelegramClient,
+    admin_id: int,
+    platform: str,
+    target_chat: str,
+    link: str,
+    on_sent: Optional[Callable[[], None]] = None
+) -> bool:
+    """
+    إضافة رابط لطابور القناة الهدف بدون انتظار الإرسال (ينتظر فقط إذا امتلأ الطابور)
+    False إذا كان الرابط في الطابور مسبقًا
+    """
+    key = (admin_id, platform, link)
+    if key in _pending:
+        return False
+
+    sender = _senders.get((admin_id, target_chat))
+    if sender is None:
+        sender = _TargetSender(client, admin_id, target_chat)
+        _senders[(admin_id, target_chat)] = sender
+
+    _pending.add(key)
+    try:
+        await sender.queue.put((platform, link, on_sent))
+    except BaseException:
+        _pending.discard(key)
+        raise
+    return True
+
+
+def get_send_queue_depth(admin_id: int) -> int:
+    """
+    عدد الروابط المنتظرة في طوابير إرسال هذا المشرف
+    """
+    return sum(
+        sender.queue.qsize()
+        for (owner, _), sender in _senders.items()
+        if owner == admin_id
+    )
+
+
+async def wait_send_flood(admin_id: int) -> FloodWaitError:
+    """
+    ينتظر حتى يتلقى إرسال هذا المشرف FloodWait أطول من CLIENT_MAX_FLOOD_WAIT_SECONDS
+    """
+    event = _send_flood_events.setdefault(admin_id, asyncio.Event())
+    await event.wait()
+    return _send_floods[admin_id]
+
+
+async def drain_senders(admin_id: Optional[int] = None):
+    """
+    إرسال ما تبقى في الطوابير ثم إيقافها (عند إيقاف الجمع)
+    """
+    keys = [k for k in _senders if admin_id is None or k[0] == admin_id]
+
+    for key in keys:
+        sender = _senders.pop(key)
+        await sender.close()
+
+    # التشغيل القادم يبدأ بدون حظر
+    for owner in [a for a in _send_flood_events if admin_id is None or a == admin_id]:
+        _send_flood_events.pop(owner, None)
+        _send_floods.pop(owner, None)
+
+
+# ======================
+# Target Sender
+# ======================
+
+class _TargetSender:
+    """
+    يجمع الروابط في رسائل متعددة الأسطر حتى حد الطول
+    ويحترم معدل الإرسال و FloodWait بدون إيقاف الفحص
+    """
+
+    def __init__(self, client: TelegramClient, admin_id: int, target_chat: str):
+        self.client = client
+        self.admin_id = admin_id
+        self.target_chat = target_chat
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self._last_sent_at = 0.0
+        # الدفعة الحالية (خرجت من الطابور ولم تُرسل بعد)
+        self._batch: List[SendItem] = []
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        try:
+            await asyncio.wait_for(self._close(), timeout=SEND_DRAIN_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._task.cancel()
+            unsent = self._batch + self._drain_nowait()
+            self._release(unsent)
+
+        # لم تُرسل ولم تُحجز: الرسائل قبل نقطة الاستئناف → تُجمع في الفحص القادم
+        if unsent:
+            metrics.inc("links_unsent_total", len(unsent))
+            logger.warning(
+                f"Send queue drain timed out: {self.target_chat}, "
+                f"{len(unsent)} links not sent"
+            )
+
+    async def _close(self):
+        await self.queue.put(None)
+        await self._task
+
+    async def _run(self):
+        closing = False
+        while not closing:
+            item = await self.queue.get()
+            if item is None:
+                return
+
+            batch = self._batch = [item]
+            length = len(item[1])
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + SEND_BATCH_WAIT_SECONDS
+
+            # تجميع ما يصل خلال فترة قصيرة حتى حد الطول
+            while True:
+                timeout = deadline - loop.time()
+                try:
+                    if timeout > 0:
+                        nxt = await asyncio.wait_for(self.queue.get(), timeout)
+                    else:
+                        nxt = self.queue.get_nowait()
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+
+                if nxt is None:
+                    closing = True
+                    break
+
+                if length + 1 + len(nxt[1]) > TELEGRAM_MESSAGE_LIMIT:
+                    await self._send(batch)
+                    batch, length = self._batch, 0
+
+                batch.append(nxt)
+                length += (1 if length else 0) + len(nxt[1])
+
+            if batch:
+                await self._send(batch)
+
+        # إغلاق: إرسال ما تبقى
+        rest = self._drain_nowait()
+        while rest:
+            chunk, rest = _take_chunk(rest)
+            self._batch = chunk + rest
+            await self._send(chunk)
+        self._batch = []
+
+    async def _send(self, batch: List[SendItem]):
+        # المشرف محظور (FloodWait طويل): لا إرسال ولا حجز → تُجمع في الفحص القادم
+        if self.admin_id in _send_floods:
+            metrics.inc("links_unsent_total", len(batch))
+            self._release(batch)
+            self._forget(batch)
+            return
+
+        # حجز ذري قبل الإرسال: عامل آخر قد يكون أرسل نفس الرابط
+        claimed = self._claim(batch)
+        if len(claimed) < len(batch):
+            metrics.inc("dedup_hits_total", len(batch) - len(claimed), layer="claim")
+            _notify_sent([item for item in batch if item not in claimed])
+        if not claimed:
+            self._release(batch)
+            self._forget(batch)
+            return
+
+        text = "\n".join(link for _, link, _ in claimed)
+        loop = asyncio.get_running_loop()
+
+        try:
+            while True:
+                delay = self._last_sent_at + SEND_MIN_INTERVAL_SECONDS - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                try:
+                    await self.client.send_message(
+                        self.target_chat,
+                        text,
+                        link_preview=False
+                    )
+                    self._last_sent_at = loop.time()
+                    metrics.inc("sends_total")
+                    metrics.inc("links_sent_total", len(claimed))
+                    break
+                except FloodWaitError as e:
+                    logger.warning(f"Send FloodWait {e.seconds}s: {self.target_chat}")
+                    metrics.inc("flood_wait_seconds_total", e.seconds, stage="send")
+
+                    # أطول من الحد → يُرفع لمشرف الحسابات بدل الانتظار
+                    if e.seconds > CLIENT_MAX_FLOOD_WAIT_SECONDS:
+                        _block_admin(self.admin_id, e)
+                        raise
+
+                    # إعادة الجدولة بعد انتهاء المهلة (الفحص لا يتأثر)
+                    self._last_sent_at = loop.time() + e.seconds
+
+        except BaseException as e:
+            # إلغاء الحجز → تُجمع مرة أخرى لاحقًا
+            self._unclaim(claimed)
+            if not isinstance(e, Exception):
+                raise
+            metrics.inc("send_errors_total")
+            logger.error(f"Send error ({self.target_chat}): {e}")
+
+        else:
+            _notify_sent(claimed)
+
+        finally:
+            self._release(batch)
+            self._forget(batch)
+
+    def _claim(self, batch: List[SendItem]) -> List[SendItem]:
+        claimed: Set[Tuple[str, str]] = set()
+        for platform, links in _group_by_platform(batch).items():
+            claimed.update((platform, link) for link in claim_links(self.admin_id, platform, links))
+        return [item for item in batch if item[:2] in claimed]
+
+    def _unclaim(self, claimed: List[SendItem]):
+        for platform, links in _group_by_platform(claimed).items():
+            release_links(self.admin_id, platform, links)
+
+    def _release(self, batch: List[SendItem]):
+        for platform, link, _ in batch:
+            _pending.discard((self.admin_id, platform, link))
+
+    def _forget(self, batch: List[SendItem]):
+        self._batch = [item for item in self._batch if item not in batch]
+
+    def _drain_nowait(self) -> List[SendItem]:
+        items = []
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return items
+            if item is not None:
+                items.append(item)
+
+
+def _block_admin(admin_id: int, error: FloodWaitError):
+    _send_floods.setdefault(admin_id, error)
+    _send_flood_events.setdefault(admin_id, asyncio.Event()).set()
+
+
+def _group_by_platform(batch: List[SendItem]) -> Dict[str, List[str]]:
+    by_platform: Dict[str, List[str]] = {}
+    for platform, link, _ in batch:
+        by_platform.setdefault(platform, []).append(link)
+    return by_platform
+
+
+def _notify_sent(items: List[SendItem]):
+    for _, _, on_sent in items:
+        if on_sent is not None:
+            on_sent()
+
+
+def _take_chunk(items: List[SendItem]):
+    length = 0
+    for i, (_, link, _) in enumerate(items):
+        length += (1 if i else 0) + len(link)
+        if i and length > TELEGRAM_MESSAGE_LIMIT:
+            return items[:i], items[i:]
+    return items, []
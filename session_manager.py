@@ -2,106 +2,25 @@ import sqlite3
 import uuid
 from datetime import datetime
 
-from telethon import TelegramClient
-from telethon.sessions import StringSession
-
-from config import API_ID, API_HASH, DATABASE_PATH
-
-
-# ======================
-# Database Helpers
-# ======================
-
-def get_connection():
-    return sqlite3.connect(
-        DATABASE_PATH,
-        check_same_thread=False
-    )
-
-
-def init_sessions_table():
-    """
-    جدول الجلسات (Telegram Accounts)
-
-    كل Session يمثل:
-    - حساب تيليجرام مستقل
-    - يُعتبر Admin مستقل في النظام
-    """
-    conn = get_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            session TEXT NOT NULL UNIQUE,
-            active INTEGER NOT NULL DEFAULT 1,
-            disabled_reason TEXT,
-            created_at TEXT
-        )
-    """)
-
-    # Migration (آمن)
-    cur.execute("PRAGMA table_info(sessions)")
-    cols = [r[1] for r in cur.fetchall()]
-
-    if "active" not in cols:
-        cur.execute("ALTER TABLE sessions ADD COLUMN active INTEGER NOT NULL DEFAULT 1")
-    if "disabled_reason" not in cols:
-        cur.execute("ALTER TABLE sessions ADD COLUMN disabled_reason TEXT")
-    if "created_at" not in cols:
-        cur.execute("ALTER TABLE sessions ADD COLUMN created_at TEXT")
-
-    conn.commit()
-    conn.close()
-
-
-# ======================
-# Session Validation
-# ======================
-
-def _validate_session_string(session_string: str):
-    """
-    التحقق من أن Session String صالح
-    ويملك صلاحية الدخول
-    """
-    client = TelegramClient(
-        StringSession(session_string),
-        API_ID,
-        API_HASH
-    )
-
-    try:
-        client.connect()
-
-        if not client.is_user_authorized():
-            raise ValueError("Session غير صالح أو منتهي")
-
-    except ValueError:
-        raise
-    except Exception:
-        raise ValueError("Session String غير صحيح")
-    finally:
-        try:
-            client.disconnect()
-        except Exception:
-            pass
+from clients import open_validated_client, register_client, release_client_nowait
+from storage import get_connection
 
 
 # ======================
 # Session Operations
 # ======================
 
-def add_session(session_string: str):
+async def add_session(session_string: str):
     """
     إضافة Session String جديد
 
     ملاحظة معمارية مهمة:
     - كل Session = Admin مستقل
     - يملك قنواته الخاصة
+
+    العميل المستخدم في التحقق يبقى متصلاً ويُعاد استخدامه في الجمع
     """
-    init_sessions_table()
-    _validate_session_string(session_string)
+    client = await open_validated_client(session_string)
 
     account_name = f"Account-{uuid.uuid4().hex[:6]}"
     created_at = datetime.utcnow().isoformat()
@@ -118,10 +37,11 @@ def add_session(session_string: str):
         conn.commit()
 
     except sqlite3.IntegrityError:
+        conn.rollback()
+        await client.disconnect()
         raise ValueError("هذا الحساب مضاف مسبقًا")
 
-    finally:
-        conn.close()
+    register_client(cur.lastrowid, client)
 
 
 def get_all_sessions(include_inactive: bool = False):
@@ -131,8 +51,6 @@ def get_all_sessions(include_inactive: bool = False):
     include_inactive = False
     → فقط الجلسات الفعالة
     """
-    init_sessions_table()
-
     conn = get_connection()
     cur = conn.cursor()
 
@@ -149,7 +67,6 @@ def get_all_sessions(include_inactive: bool = False):
         """)
 
     rows = cur.fetchall()
-    conn.close()
 
     return [
         {
@@ -167,8 +84,6 @@ def disable_session(session_id: int, reason: str = "Disabled by admin"):
     """
     تعطيل جلسة بدون حذفها
     """
-    init_sessions_table()
-
     conn = get_connection()
     cur = conn.cursor()
 
@@ -180,15 +95,14 @@ def disable_session(session_id: int, reason: str = "Disabled by admin"):
     """, (reason, session_id))
 
     conn.commit()
-    conn.close()
+
+    release_client_nowait(session_id)
 
 
 def enable_session(session_id: int):
     """
     إعادة تفعيل جلسة
     """
-    init_sessions_table()
-
     conn = get_connection()
     cur = conn.cursor()
 
@@ -200,15 +114,12 @@ def enable_session(session_id: int):
     """, (session_id,))
 
     conn.commit()
-    conn.close()
 
 
 def delete_session(session_id: int):
     """
     حذف جلسة يدويًا (قرار إداري فقط)
     """
-    init_sessions_table()
-
     conn = get_connection()
     cur = conn.cursor()
 
@@ -218,4 +129,5 @@ def delete_session(session_id: int):
     )
 
     conn.commit()
-    conn.close()
+
+    release_client_nowait(session_id)
@@ -0,0 +1,261 @@
+import os
+import sqlite3
+import threading
+
+from config import DATABASE_PATH
+
+
+# ======================
+# Settings
+# ======================
+
+# اتصال واحد طويل العمر لكل Thread (بدل اتصال جديد لكل استعلام)
+# WAL يسمح بالقراءة أثناء الكتابة (البوت + الجامع بدون تعارض)
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",
+)
+
+# عدد الاستعلامات المُحضّرة (prepared statements) المحفوظة لكل اتصال
+CACHED_STATEMENTS = 256
+
+_local = threading.local()
+_migrate_lock = threading.Lock()
+_migrated = False
+
+
+# ======================
+# Connection
+# ======================
+
+def get_connection() -> sqlite3.Connection:
+    """
+    الاتصال المشترك للـ Thread الحالي
+    ⚠️ لا تغلقه: يُعاد استخدامه في كل الاستعلامات
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _connect()
+        _local.conn = conn
+    return conn
+
+
+def _connect() -> sqlite3.Connection:
+    dir_name = os.path.dirname(DATABASE_PATH)
+    if dir_name:
+        os.makedirs(dir_name, exist_ok=True)
+
+    conn = sqlite3.connect(
+        DATABASE_PATH,
+        check_same_thread=False,
+        cached_statements=CACHED_STATEMENTS,
+    )
+
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+
+    return conn
+
+
+# ======================
+# Migrations
+# ======================
+
+def init_storage():
+    """
+    تشغيل الـ migrations مرة واحدة فقط عند بدء التشغيل
+    (النسخة محفوظة في PRAGMA user_version)
+    """
+    global _migrated
+
+    if _migrated:
+        return
+
+    with _migrate_lock:
+        if _migrated:
+            return
+
+        conn = get_connection()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+
+        for target_version, migrate in enumerate(MIGRATIONS, start=1):
+            if version >= target_version:
+                continue
+
+            with conn:
+                migrate(conn)
+                conn.execute(f"PRAGMA user_version = {target_version}")
+
+        _migrated = True
+
+
+def _migration_initial(conn: sqlite3.Connection):
+    """
+    الجداول الأساسية (آمنة على قواعد البيانات القديمة)
+    """
+
+    # ========= Admin Targets =========
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS admin_targets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_id INTEGER NOT NULL,
+            platform TEXT NOT NULL,
+            target_chat TEXT NOT NULL,
+            UNIQUE(admin_id, platform)
+        )
+    """)
+
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_admin_targets_admin
+        ON admin_targets (admin_id)
+    """)
+
+    # ========= Dedup Index =========
+    # بديل فحص آخر 200 رسالة في القناة
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sent_links (
+            admin_id INTEGER NOT NULL,
+            platform TEXT NOT NULL,
+            link TEXT NOT NULL,
+            sent_at TEXT,
+            PRIMARY KEY (admin_id, platform, link)
+        ) WITHOUT ROWID
+    """)
+
+    # القنوات التي تمت تعبئة الفهرس من تاريخها الكامل
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS dedup_seeded_targets (
+            admin_id INTEGER NOT NULL,
+            platform TEXT NOT NULL,
+            target_chat TEXT NOT NULL,
+            seeded_at TEXT,
+            PRIMARY KEY (admin_id, platform, target_chat)
+        ) WITHOUT ROWID
+    """)
+
+    # ========= Scan Checkpoints =========
+    # آخر رسالة تمت معالجتها لكل (جلسة، محادثة)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS scan_checkpoints (
+            session_id INTEGER NOT NULL,
+            dialog_id INTEGER NOT NULL,
+            last_message_id INTEGER NOT NULL,
+            updated_at TEXT,
+            PRIMARY KEY (session_id, dialog_id)
+        ) WITHOUT ROWID
+    """)
+
+    # ========= Sessions =========
+    # كل Session = حساب تيليجرام مستقل = Admin مستقل
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            session TEXT NOT NULL UNIQUE,
+            active INTEGER NOT NULL DEFAULT 1,
+            disabled_reason TEXT,
+            created_at TEXT
+        )
+    """)
+
+    # Migration (آمن) لجداول sessions القديمة
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(sessions)").fetchall()]
+
+    if "active" not in cols:
+        conn.execute("ALTER TABLE sessions ADD COLUMN active INTEGER NOT NULL DEFAULT 1")
+    if "disabled_reason" not in cols:
+        conn.execute("ALTER TABLE sessions ADD COLUMN disabled_reason TEXT")
+    if "created_at" not in cols:
+        conn.execute("ALTER TABLE sessions ADD COLUMN created_at TEXT")
+
+
+def _migration_file_link_cache(conn: sqlite3.Connection):
+    """
+    كاش روابط الملفات: نفس الملف المُعاد توجيهه لا يُحمّل ولا يُحلل مرتين
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS file_link_cache (
+            cache_key TEXT PRIMARY KEY,
+            links TEXT NOT NULL,
+            size INTEGER,
+            last_used_at REAL NOT NULL
+        )
+    """)
+
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_file_link_cache_last_used
+        ON file_link_cache (last_used_at)
+    """)
+
+
+def _migration_reseed_canonical_links(conn: sqlite3.Connection):
+    """
+    الروابط أصبحت تُخزن بالشكل الموحد (canonical)
+    → إعادة تعبئة الفهرس من تاريخ كل قناة هدف بالمفاتيح الجديدة
+    """
+    conn.execute("DELETE FROM dedup_seeded_targets")
+
+
+def _migration_tg_message_link_chats(conn: sqlite3.Connection):
+    """
+    الشاتات التي جُمع منها رابط رسالة تيليجرام (رابط واحد لكل شات)
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tg_message_link_chats (
+            chat_id INTEGER PRIMARY KEY,
+            collected_at REAL NOT NULL
+        )
+    """)
+
+
+def _migration_collector_state(conn: sqlite3.Connection):
+    """
+    حالة الجامع العامة (key / value) مثل وقت آخر إيقاف
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS collector_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+
+
+def _migration_tg_message_link_chats_per_admin(conn: sqlite3.Connection):
+    """
+    رابط رسالة واحد لكل (مشرف، شات) بدل كل شات: حجز مشرف لا يمنع الباقين
+    + الرابط المحجوز (نفس الرابط عند إعادة الفحص لا يُرفض)
+    الصفوف القديمة بدون مشرف لا يمكن نسبتها لأحد → تُحذف
+    """
+    conn.execute("DROP TABLE IF EXISTS tg_message_link_chats")
+    conn.execute("""
+        CREATE TABLE tg_message_link_chats (
+            admin_id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL,
+            link TEXT NOT NULL,
+            collected_at REAL NOT NULL,
+            PRIMARY KEY (admin_id, chat_id)
+        ) WITHOUT ROWID
+    """)
+
+
+def _migration_reseed_classified_links(conn: sqlite3.Connection):
+    """
+    الروابط أصبحت تُرسل وتُخزن مبنية من مفتاح التصنيف (t.me/+X بدون query ...)
+    → إعادة تعبئة الفهرس من تاريخ كل قناة هدف بالشكل الجديد
+    """
+    conn.execute("DELETE FROM dedup_seeded_targets")
+
+
+# الترتيب مهم: أضف الـ migrations الجديدة في النهاية فقط
+MIGRATIONS = [
+    _migration_initial,
+    _migration_file_link_cache,
+    _migration_reseed_canonical_links,
+    _migration_tg_message_link_chats,
+    _migration_collector_state,
+    _migration_tg_message_link_chats_per_admin,
+    _migration_reseed_classified_links,
+]
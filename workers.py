@@ -0,0 +1,184 @@
+"""
+تشغيل الجمع على عدة Processes (كل Process يملك جزءًا من الجلسات)
+
+- الجلسات تُوزع حسب id % عدد العمال
+- التنسيق بين العمال عبر قاعدة SQLite المشتركة (WAL):
+  منع التكرار (حجز ذري قبل الإرسال)، نقاط الاستئناف، قنوات المشرفين
+
+من البوت: COLLECTOR_WORKERS > 1
+أو مباشرة بدون البوت:
+    python workers.py --workers 4 --platform telegram --mode history
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import signal
+from typing import List
+
+# ======================
+# Logging
+# ======================
+
+logger = logging.getLogger(__name__)
+
+# ======================
+# Settings
+# ======================
+
+# مهلة انتظار إنهاء العامل بعد طلب الإيقاف قبل إنهائه بالقوة
+WORKER_STOP_TIMEOUT_SECONDS = 120
+
+# ======================
+# Global State
+# ======================
+
+_ctx = multiprocessing.get_context("spawn")
+_processes: List[multiprocessing.Process] = []
+_stop_event = None  # multiprocessing Event مشترك مع كل العمال
+
+
+# ======================
+# Public API
+# ======================
+
+def is_sharded_collecting() -> bool:
+    return any(p.is_alive() for p in _processes)
+
+
+def start_sharded_collection(
+    workers: int,
+    platform: str | None = None,
+    mode: str = "history",
+    lookback_days: int | None = None
+):
+    """
+    تشغيل N عامل، كل عامل = Process مستقل بعملائه الخاصة
+    """
+    global _stop_event
+
+    if is_sharded_collecting():
+        return
+
+    from collector import clear_worker_metrics
+
+    # مقاييس التشغيل السابق لا تُجمع مع الحالي
+    clear_worker_metrics(workers)
+
+    _processes.clear()
+    _stop_event = _ctx.Event()
+
+    for index in range(workers):
+        proc = _ctx.Process(
+            target=_worker_main,
+            args=(index, workers, platform, mode, lookback_days, _stop_event),
+            name=f"collector-{index}",
+        )
+        proc.start()
+        _processes.append(proc)
+
+    logger.info(f"Started {workers} collector workers")
+
+
+async def stop_sharded_collection():
+    """
+    طلب الإيقاف من كل العمال وانتظارهم (بدون إيقاف الـ event loop)
+    """
+    if _stop_event is not None:
+        _stop_event.set()
+
+    await asyncio.to_thread(_join_all)
+
+
+# ======================
+# Worker Process
+# ======================
+
+def _join_all():
+    for proc in _processes:
+        proc.join(WORKER_STOP_TIMEOUT_SECONDS)
+        if proc.is_alive():
+            logger.warning(f"{proc.name} did not stop, terminating")
+            proc.terminate()
+            proc.join()
+
+    _processes.clear()
+
+
+def _worker_main(
+    index: int,
+    count: int,
+    platform: str | None,
+    mode: str,
+    lookback_days: int | None,
+    stop_event
+):
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s [worker {index}] %(name)s: %(message)s"
+    )
+
+    # Ctrl+C يصل للأب فقط، والأب يطلب الإيقاف عبر stop_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    from database import init_db
+
+    init_db()
+    asyncio.run(_worker_async(index, count, platform, mode, lookback_days, stop_event))
+
+
+async def _worker_async(
+    index: int,
+    count: int,
+    platform: str | None,
+    mode: str,
+    lookback_days: int | None,
+    stop_event
+):
+    from collector import start_collection, stop_collection
+
+    task = asyncio.create_task(start_collection(
+        platform=platform,
+        lookback_days=lookback_days,
+        mode=mode,
+        shard=(index, count),
+    ))
+
+    while not task.done() and not stop_event.is_set():
+        await asyncio.sleep(1)
+
+    stop_collection()
+    await task
+
+
+# ======================
+# CLI
+# ======================
+
+def main():
+    from config import COLLECTOR_WORKERS
+
+    parser = argparse.ArgumentParser(description="Sharded link collector")
+    parser.add_argument("--workers", type=int, default=max(COLLECTOR_WORKERS, multiprocessing.cpu_count()))
+    parser.add_argument("--platform", choices=("telegram", "whatsapp"), default=None)
+    parser.add_argument("--mode", choices=("history", "live", "catchup"), default="history")
+    parser.add_argument("--lookback-days", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    from database import init_db
+
+    init_db()
+    start_sharded_collection(args.workers, args.platform, args.mode, args.lookback_days)
+
+    try:
+        for proc in _processes:
+            proc.join()
+    except KeyboardInterrupt:
+        logger.info("Stopping workers...")
+        asyncio.run(stop_sharded_collection())
+
+
+if __name__ == "__main__":
+    main()